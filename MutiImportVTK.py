@@ -1,79 +1,94 @@
 import meshio
 import vtk
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QApplication, QLabel
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, pyqtSignal
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import os
-
-
-def meshio_to_vtk_unstructured_grid(mesh):
-    """将 meshio 读取的数据转换为 vtkUnstructuredGrid，支持 tetra 和 triangle"""
-    points = vtk.vtkPoints()
-    for p in mesh.points:
-        points.InsertNextPoint(p[:3])
-
-    ugrid = vtk.vtkUnstructuredGrid()
-    ugrid.SetPoints(points)
-
-    # 添加 tetra 四面体
-    if "tetra" in mesh.cells_dict:
-        for cell in mesh.cells_dict["tetra"]:
-            tetra = vtk.vtkTetra()
-            for i in range(4):
-                tetra.GetPointIds().SetId(i, cell[i])
-            ugrid.InsertNextCell(tetra.GetCellType(), tetra.GetPointIds())
-
-    # 添加 triangle 面片
-    if "triangle" in mesh.cells_dict:
-        for cell in mesh.cells_dict["triangle"]:
-            triangle = vtk.vtkTriangle()
-            for i in range(3):
-                triangle.GetPointIds().SetId(i, cell[i])
-            ugrid.InsertNextCell(triangle.GetCellType(), triangle.GetPointIds())
-
-    return ugrid
+import time
+
+from beforeC_new import meshio_to_vtk_unstructured_grid_fast
+from surface_pipeline import load_lod_levels, DEFAULT_TRIANGLE_BUDGET
+
+# 交互（旋转/缩放）时期望的帧率，vtkLODProp3D 据此自动选择细节级别
+INTERACTIVE_UPDATE_RATE = 20.0
+# 静止时的帧率要求，足够低以保证总是渲染全分辨率
+STILL_UPDATE_RATE = 0.001
+# 按键切换模型的延迟目标（毫秒），超出时打印提示
+SWITCH_LATENCY_TARGET_MS = 50.0
+
+
+# VTK 原生 C++ 读取器，按扩展名分派；.vtk 使用通用读取器以兼容 POLYDATA / UNSTRUCTURED_GRID 等类型
+NATIVE_READERS = {
+    '.vtk': vtk.vtkDataSetReader,
+    '.vtu': vtk.vtkXMLUnstructuredGridReader,
+    '.vtp': vtk.vtkXMLPolyDataReader,
+    '.ply': vtk.vtkPLYReader,
+    '.stl': vtk.vtkSTLReader,
+}
+
+# 受试者目录下各组织模型文件，顺序与 MultiMeshViewer.colors 对应
+TISSUE_MODEL_FILES = (
+    "vtk_model/scalp.vtk",
+    "vtk_model/bone.vtk",
+    "vtk_model/csf.vtk",
+    "vtk_model/gray_matter.vtk",
+    "vtk_model/white_matter.vtk",
+)
+
+def tissue_model_files(mesh_path):
+    return [os.path.join(mesh_path, name) for name in TISSUE_MODEL_FILES]
+
+
+def _read_native(filename, reader_class):
+    """用VTK原生读取器读取，失败或读到空数据时返回 None"""
+    reader = reader_class()
+    reader.SetFileName(filename)
+    reader.Update()
+    output = reader.GetOutput()
+    if reader.GetErrorCode() != 0 or output is None or output.GetNumberOfPoints() == 0:
+        return None
+    return output
 
 
 def load_vtk_file(filename):
-    """加载VTK文件"""
+    """
+    加载网格文件：VTK 原生读取器能处理的格式优先走原生读取器，
+    其余格式（或原生读取失败时）再用 meshio 读取并批量转换。
+    """
+    start = time.perf_counter()
+    file_ext = os.path.splitext(filename)[1].lower()
+    data, method = None, None
     try:
-        # 首先尝试使用meshio读取
-        try:
-            mesh = meshio.read(filename)
-            return meshio_to_vtk_unstructured_grid(mesh)
-        except:
-            # 如果meshio失败，尝试使用VTK原生读取器
-            reader = None
-            file_ext = os.path.splitext(filename)[1].lower()
-
-            if file_ext == '.vtk':
-                reader = vtk.vtkUnstructuredGridReader()
-            elif file_ext == '.vtu':
-                reader = vtk.vtkXMLUnstructuredGridReader()
-            elif file_ext == '.vtp':
-                reader = vtk.vtkXMLPolyDataReader()
-            elif file_ext == '.ply':
-                reader = vtk.vtkPLYReader()
-            elif file_ext == '.stl':
-                reader = vtk.vtkSTLReader()
-
-            if reader:
-                reader.SetFileName(filename)
-                reader.Update()
-                return reader.GetOutput()
-            else:
-                print(f"不支持的文件格式: {file_ext}")
-                return None
+        reader_class = NATIVE_READERS.get(file_ext)
+        if reader_class is not None:
+            data = _read_native(filename, reader_class)
+            method = reader_class.__name__
 
+        if data is None:
+            mesh = meshio.read(filename)
+            data = meshio_to_vtk_unstructured_grid_fast(mesh)
+            method = "meshio"
     except Exception as e:
         print(f"加载文件 {filename} 失败: {e}")
         return None
 
+    elapsed = time.perf_counter() - start
+    print(f"加载 {os.path.basename(filename)} 用时 {elapsed:.3f} s ({method})")
+    return data
+
 
 class MultiMeshViewer(QWidget):
-    def __init__(self, mesh_path, parent=None):
+    # 单个组织加载完成 (索引, 细节级别列表或None)，由工作线程发出、在GUI线程中处理
+    mesh_loaded = pyqtSignal(int, object)
+    # 所有组织加载结束
+    all_meshes_loaded = pyqtSignal()
+
+    def __init__(self, mesh_path, parent=None, triangle_budget=DEFAULT_TRIANGLE_BUDGET):
         super().__init__(parent)
+        # 每个组织渲染表面的三角形上限，None 表示不抽稀
+        self.triangle_budget = triangle_budget
 
         # 设置窗口标题和大小
         self.setWindowTitle("多VTK文件查看器 - 按1-5键切换显示")
@@ -99,17 +114,21 @@ class MultiMeshViewer(QWidget):
         self.renderer = vtk.vtkRenderer()
         self.vtk_widget.GetRenderWindow().AddRenderer(self.renderer)
         self.interactor = self.vtk_widget.GetRenderWindow().GetInteractor()
-
-        # 存储网格数据和对应的actor
-        self.vtk_grids = []
+        self.interactor.SetDesiredUpdateRate(INTERACTIVE_UPDATE_RATE)
+        self.interactor.SetStillUpdateRate(STILL_UPDATE_RATE)
+
+        # 帧率显示，用于验证LOD的效果
+        self.fps_actor = vtk.vtkTextActor()
+        self.fps_actor.GetTextProperty().SetFontSize(14)
+        self.fps_actor.GetTextProperty().SetColor(1, 1, 1)
+        self.fps_actor.SetPosition(10, 10)
+        self._fps_observer = self.renderer.AddObserver('EndEvent', self._update_fps)
+
+        # 存储各组织的细节级别几何、LOD actor及其共享的属性
+        self.lod_levels = []
         self.actors = []
-        self.mesh_filenames = [
-            os.path.join(mesh_path, "vtk_model/scalp.vtk"),
-            os.path.join(mesh_path,"vtk_model/bone.vtk"),
-            os.path.join(mesh_path, "vtk_model/csf.vtk"),
-            os.path.join(mesh_path, "vtk_model/gray_matter.vtk"),
-            os.path.join(mesh_path, "vtk_model/white_matter.vtk"),
-        ]
+        self.properties = []
+        self.mesh_filenames = tissue_model_files(mesh_path)
 
         # 定义不同的颜色
         self.colors = [
@@ -120,7 +139,16 @@ class MultiMeshViewer(QWidget):
             (1.0, 0.0, 1.0),  # 品红色
         ]
 
-        # 加载所有VTK文件
+        # dispose() 之后为 True
+        self.disposed = False
+        # 当前显示的模型索引，None 表示显示全部
+        self.current_index = None
+        # 最近一次切换显示的耗时（毫秒）
+        self.last_switch_ms = None
+        self.renderer.AddViewProp(self.fps_actor)
+
+        # 并行加载所有VTK文件，每个组织就绪后立即显示
+        self.mesh_loaded.connect(self._on_mesh_loaded)
         self.load_all_meshes()
 
         # 设置键盘事件处理
@@ -133,42 +161,94 @@ class MultiMeshViewer(QWidget):
         self.renderer.SetBackground(0.1, 0.1, 0.2)
 
     def load_all_meshes(self):
-        """加载所有网格文件"""
+        """在线程池中并行加载所有网格文件（VTK读取器会释放GIL），逐个通过 mesh_loaded 回到GUI线程"""
         print("开始加载VTK文件...")
+        self._load_start = time.perf_counter()
+        self.lod_levels = [None] * len(self.mesh_filenames)
+        self.actors = [None] * len(self.mesh_filenames)
+        self.properties = [None] * len(self.mesh_filenames)
+        self._pending = 0
 
+        executor = ThreadPoolExecutor(max_workers=len(self.mesh_filenames))
         for i, filename in enumerate(self.mesh_filenames):
             if not os.path.exists(filename):
                 print(f"文件不存在: {filename}")
-                self.vtk_grids.append(None)
-                self.actors.append(None)
                 continue
+            self._pending += 1
+            executor.submit(self._load_worker, i, filename)
+        executor.shutdown(wait=False)
 
-            print(f"加载文件 {i + 1}/5: {filename}")
-            vtk_grid = load_vtk_file(filename)
-
-            if vtk_grid is not None:
-                self.vtk_grids.append(vtk_grid)
-
-                # 创建mapper和actor
-                mapper = vtk.vtkDataSetMapper()
-                mapper.SetInputData(vtk_grid)
+        if self._pending == 0:
+            self.all_meshes_loaded.emit()
 
-                actor = vtk.vtkActor()
-                actor.SetMapper(mapper)
-
-                # 设置颜色
-                #if i < len(self.colors):
-                #    actor.GetProperty().SetColor(self.colors[i])
-
-                # 设置透明度以便在组合显示时能看到内部结构
-                #actor.GetProperty().SetOpacity(0.7)
-
-                self.actors.append(actor)
-                print(f"成功加载: {filename}")
+    def _load_worker(self, index, filename):
+        """工作线程：读取单个文件、生成各细节级别后发出完成信号；表面已缓存时不读取原始网格"""
+        print(f"加载文件 {index + 1}/{len(self.mesh_filenames)}: {filename}")
+        levels = load_lod_levels(filename, load_vtk_file, self.triangle_budget)
+        try:
+            self.mesh_loaded.emit(index, levels)
+        except RuntimeError:
+            # 加载期间窗口已被销毁
+            pass
+
+    def _on_mesh_loaded(self, index, levels):
+        """GUI线程：为加载完成的组织创建LOD actor，并按当前显示模式立即显示"""
+        if self.disposed:
+            return
+        self._pending -= 1
+        filename = self.mesh_filenames[index]
+
+        if levels is not None:
+            self.lod_levels[index] = levels
+            self.actors[index], self.properties[index] = self.create_lod_actor(levels)
+            print(f"成功加载: {filename} (细节级别面片数: {[g.GetNumberOfCells() for g in levels]})")
+
+            # actor 只加入渲染器一次，之后通过可见性切换显示
+            self.renderer.AddActor(self.actors[index])
+            if self.current_index is None:
+                self.show_all_models(reset_camera=True)
+            elif self.current_index == index:
+                self.show_single_model(index, reset_camera=True)
             else:
-                self.vtk_grids.append(None)
-                self.actors.append(None)
-                print(f"加载失败: {filename}")
+                self.actors[index].VisibilityOff()
+        else:
+            print(f"加载失败: {filename}")
+
+        if self._pending == 0:
+            print(f"VTK文件加载完成，用时 {time.perf_counter() - self._load_start:.2f} s")
+            self.all_meshes_loaded.emit()
+
+    def create_lod_actor(self, levels):
+        """
+        用 vtkLODProp3D 组合从高到低的细节级别，所有级别共享一个 vtkProperty。
+        渲染时根据渲染窗口期望帧率分配的时间自动选择能按时完成的最高级别：
+        静止时显示全分辨率表面，旋转时退化为抽稀表面或点精灵。
+        """
+        prop = vtk.vtkProperty()
+
+        # 设置颜色
+        #if i < len(self.colors):
+        #    prop.SetColor(self.colors[i])
+
+        # 设置透明度以便在组合显示时能看到内部结构
+        #prop.SetOpacity(0.7)
+
+        lod_actor = vtk.vtkLODProp3D()
+        lod_actor.AutomaticLODSelectionOn()
+        for level in levels:
+            mapper = vtk.vtkPolyDataMapper()
+            mapper.SetInputData(level)
+            lod_actor.AddLOD(mapper, prop, 0.0)
+        if levels[-1].GetNumberOfPolys() == 0:
+            # 点精灵级别：点渲染为小球，只影响点图元，不影响表面级别
+            prop.SetPointSize(3)
+            prop.RenderPointsAsSpheresOn()
+        return lod_actor, prop
+
+    def _update_fps(self, obj, event):
+        render_time = self.renderer.GetLastRenderTimeInSeconds()
+        if render_time > 0:
+            self.fps_actor.SetInput(f"FPS: {1.0 / render_time:.1f}")
 
     def setup_keyboard_interaction(self):
         """设置键盘交互"""
@@ -185,39 +265,45 @@ class MultiMeshViewer(QWidget):
 
         self.interactor.AddObserver('KeyPressEvent', keypress_callback)
 
-    def clear_renderer(self):
-        """清空渲染器"""
-        self.renderer.RemoveAllViewProps()
+    def _finish_switch(self, start, reset_camera):
+        if reset_camera:
+            self.renderer.ResetCamera()
+        self.vtk_widget.GetRenderWindow().Render()
+        self.last_switch_ms = (time.perf_counter() - start) * 1000.0
+        if self.last_switch_ms > SWITCH_LATENCY_TARGET_MS:
+            print(f"切换显示耗时 {self.last_switch_ms:.1f} ms，超过目标 {SWITCH_LATENCY_TARGET_MS:.0f} ms")
 
-    def show_all_models(self):
-        """显示所有模型"""
-        self.clear_renderer()
+    def show_all_models(self, reset_camera=False):
+        """显示所有模型；只切换可见性，reset_camera 为 True 时才重置视角"""
+        start = time.perf_counter()
+        self.current_index = None
 
         count = 0
-        for i, actor in enumerate(self.actors):
+        for actor in self.actors:
             if actor is not None:
                 # 设置透明度以便观察组合效果
                 #actor.GetProperty().SetOpacity(0.6)
-                self.renderer.AddActor(actor)
+                actor.VisibilityOn()
                 count += 1
 
-        self.info_label.setText(f"当前显示: 所有模型 ({count}个) | 按键盘1-5切换单个模型，按0显示所有模型")
+        self.info_label.setText(f"当前显示: 所有模型 ({count}个) | 按键盘1-5切换单个模型，按0显示所有模型，按R重置视角")
 
-        if count > 0:
-            self.renderer.ResetCamera()
-        self.vtk_widget.GetRenderWindow().Render()
+        self._finish_switch(start, reset_camera and count > 0)
 
-    def show_single_model(self, index):
-        """显示单个模型"""
+    def show_single_model(self, index, reset_camera=False):
+        """显示单个模型；只切换可见性，reset_camera 为 True 时才重置视角"""
         if index >= len(self.actors) or self.actors[index] is None:
             print(f"模型 {index + 1} 不存在或加载失败")
             return
 
-        self.clear_renderer()
+        start = time.perf_counter()
+        self.current_index = index
+        for i, actor in enumerate(self.actors):
+            if actor is not None:
+                actor.SetVisibility(i == index)
 
         # 设置不透明度
-        self.actors[index].GetProperty().SetOpacity(1.0)
-        self.renderer.AddActor(self.actors[index])
+        self.properties[index].SetOpacity(1.0)
 
         if(index ==0):
             filename = "头皮"
@@ -229,10 +315,19 @@ class MultiMeshViewer(QWidget):
             filename = "灰质"
         elif(index ==4):
             filename = "白质"
-        self.info_label.setText(f"当前显示: 模型 {index + 1} ({filename}) | 按键盘1-5切换单个模型，按0显示所有模型")
+        self.info_label.setText(f"当前显示: 模型 {index + 1} ({filename}) | 按键盘1-5切换单个模型，按0显示所有模型，按R重置视角")
 
-        self.renderer.ResetCamera()
-        self.vtk_widget.GetRenderWindow().Render()
+        self._finish_switch(start, reset_camera)
+
+    def dispose(self):
+        """页面被移除时释放渲染资源；之后才加载完成的组织被忽略"""
+        self.disposed = True
+        self.renderer.RemoveObserver(self._fps_observer)
+        self.renderer.RemoveAllViewProps()
+        self.lod_levels = []
+        self.actors = []
+        self.properties = []
+        self.vtk_widget.Finalize()
 
     def keyPressEvent(self, event):
         """处理Qt键盘事件（备用方案）"""
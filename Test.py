@@ -1,11 +1,11 @@
 import sys
+import time
 
-import meshio
 import numpy as np
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal
 from PyQt6.QtGui import QPixmap
 from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QFrame, QStackedWidget, QWidget, QPushButton, \
-    QHBoxLayout, QLabel, QComboBox, QDialog, QProgressBar, QTabWidget
+    QHBoxLayout, QLabel, QComboBox, QDialog, QProgressBar, QTabWidget, QMessageBox
 import os
 import matplotlib
 matplotlib.use("Agg")
@@ -15,13 +15,110 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
 import nii_view
-from afterC_new import MeshViewer, meshio_to_vtk_unstructured_grid_max
-from beforeC_new import meshio_to_vtk_unstructured_grid
-from MutiImportVTK import MultiMeshViewer
+import nii_vtk_view
+from afterC_new import MeshViewer, FieldPointCache
+from beforeC_new import meshio_to_vtk_unstructured_grid_fast
+from MutiImportVTK import MultiMeshViewer, tissue_model_files, load_vtk_file
+from mesh_cache import read_mesh_cached, ByteBudgetLRU
+from loader_pipeline import LoadPipeline
+from page_lifecycle import dispose_page, process_rss_bytes, format_memory
+from surface_pipeline import extract_surface, load_lod_levels, DEFAULT_TRIANGLE_BUDGET
 
 os.environ['VTK_SILENCE_GET_VOID_POINTER_WARNINGS'] = '1'
 os.environ['VTK_DEBUG_LEAKS'] = '0'
 
+# 内存中最多保留的受试者头部表面总字节数（结果页显示用，原始网格不保留）
+MESH_LRU_MAX_BYTES = 512 * 1024 ** 2
+# 结果页电场点云缓存（含预取的相邻刺激配置）的总字节数
+FIELD_CACHE_MAX_BYTES = 512 * 1024 ** 2
+# 各页面在 QStackedWidget 中的层级：进入某一层时，该层及更深的旧页面会被释放
+PAGE_HOME, PAGE_NII, PAGE_CONFIG, PAGE_RESULT = range(4)
+# 影像页的显示方式：matplotlib 切片浏览器或 VTK（GPU 切片与 MIP）浏览器
+NII_VIEWER_MATPLOTLIB = "Matplotlib"
+NII_VIEWER_VTK = "VTK (GPU)"
+# 状态栏内存读数的刷新间隔（毫秒）
+MEMORY_READOUT_INTERVAL_MS = 2000
+# 后台加载阶段在进度条中所占的比例，其余留给 GUI 线程中的上传（创建 actor、首次渲染）
+BACKGROUND_PROGRESS_SHARE = 90
+
+
+class LazyTabWidget(QTabWidget):
+    """
+    选项卡内容在第一次切换到该页时才由 builder(layout) 创建。
+    builder 可以稍后用 set_builder 提供（数据仍在后台计算时），在此之前该页显示占位提示。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.builders = {}  # 尚未创建内容的页面 -> builder 或 None（数据未就绪）
+        self.placeholders = {}  # 页面 -> 占位提示
+        self.currentChanged.connect(self.build_tab)
+
+    def add_lazy_tab(self, title, builder=None, placeholder_text="正在计算..."):
+        page = QWidget()
+        layout = QVBoxLayout(page)
+        if builder is None:
+            placeholder = QLabel(placeholder_text)
+            placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            layout.addWidget(placeholder)
+            self.placeholders[page] = placeholder
+        self.builders[page] = builder
+        index = self.addTab(page, title)
+        if index == self.currentIndex():
+            self.build_tab(index)
+        return page
+
+    def set_builder(self, page, builder):
+        """提供页面的 builder；该页正在显示时立即创建内容"""
+        if page not in self.builders:
+            return
+        self.builders[page] = builder
+        if page is self.currentWidget():
+            self.build_tab(self.currentIndex())
+
+    def build_tab(self, index):
+        page = self.widget(index)
+        builder = self.builders.get(page)
+        if builder is None:
+            return
+        del self.builders[page]
+        placeholder = self.placeholders.pop(page, None)
+        if placeholder is not None:
+            placeholder.deleteLater()
+        try:
+            builder(page.layout())
+        except Exception as e:
+            import traceback
+            print(f"绘制选项卡失败 {self.tabText(index)}: {e}")
+            print(traceback.format_exc())
+            error_label = QLabel("图表绘制失败")
+            error_label.setStyleSheet("color: red;")
+            page.layout().addWidget(error_label)
+
+
+class AnalysisWorker(QThread):
+    """在后台线程中依次计算结果页的分析数据（analysis_npy.iter_result_products），每完成一项发出一次信号"""
+    product_ready = pyqtSignal(object, object)  # (键, 可直接绘图的数据)
+    failed = pyqtSignal(str)
+
+    def __init__(self, base_dir):
+        super().__init__()
+        self.base_dir = base_dir
+
+    def run(self):
+        from analysis_npy import iter_result_products
+        try:
+            for key, value in iter_result_products(self.base_dir):
+                if self.isInterruptionRequested():
+                    return
+                self.product_ready.emit(key, value)
+        except Exception as e:
+            import traceback
+            print(f"加载分析数据出错: {e}")
+            print(traceback.format_exc())
+            if not self.isInterruptionRequested():
+                self.failed.emit(str(e))
+
 
 class LoadingDialog(QDialog):
     def __init__(self, text="加载中，请稍候..."):
@@ -62,51 +159,61 @@ class LoadingDialog(QDialog):
         layout.addWidget(icon_label)
 
         # 加载文本
+        self.text = text
         self.label = QLabel(text)
         self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(self.label)
 
-        # 进度条
+        # 进度条，由 set_progress 按加载阶段更新
         self.progress = QProgressBar()
-        self.progress.setRange(0, 0)  # 无限循环
+        self.progress.setRange(0, 100)
+        self.progress.setValue(0)
         self.progress.setFixedHeight(10)
         layout.addWidget(self.progress)
 
         self.setLayout(layout)
 
+    def set_progress(self, percent, stage=""):
+        self.progress.setValue(int(percent))
+        self.label.setText(f"{self.text}\n{stage}" if stage else self.text)
 
-class MeshReaderThread(QThread):
-    def __init__(self, msh_path):
-        super().__init__()
-        self.msh_path = msh_path
-        self.mesh = None
 
-    def run(self):
-        # 在子线程中读取文件
-        self.mesh = meshio.read(self.msh_path)
+def tissue_surface_stages(path):
+    """预热 vtk_model 各组织表面缓存的加载阶段，MultiMeshViewer 随后直接命中缓存"""
+    def warm(result, report):
+        files = [f for f in tissue_model_files(path) if os.path.exists(f)]
+        for i, filename in enumerate(files):
+            report(i / len(files))
+            load_lod_levels(filename, load_vtk_file, DEFAULT_TRIANGLE_BUDGET)
+    return [("预处理组织模型", 2, warm)]
 
-class MeshResultLoaderThread(QThread):
-    finished = pyqtSignal(object)  # 传 vtkGrid 或 mesh 文件路径
 
-    def __init__(self, mesh,npy_path):
-        super().__init__()
-        self.mesh = mesh
-        self.npy_path = npy_path
+def subject_mesh_stages(path):
+    """
+    读取 sub-control.msh（命中磁盘缓存时跳过 meshio 解析）、转换为 vtkGrid 并提取头部表面。
+    结果只保留 result['surface']，解析后的网格和 vtkGrid 在提取后即释放
+    """
+    msh_path = os.path.join(path, "sub-control.msh")
 
-    def run(self):
-        vtk_grid = meshio_to_vtk_unstructured_grid_max(self.mesh, self.npy_path)
-        self.finished.emit(vtk_grid)
+    def read(result, report):
+        result['mesh'] = read_mesh_cached(msh_path, report)
 
-class MeshLoaderThread(QThread):
-    finished = pyqtSignal(object)  # 传 vtkGrid 或 mesh 文件路径
+    def convert(result, report):
+        result['vtk_grid'] = meshio_to_vtk_unstructured_grid_fast(result['mesh'])
 
-    def __init__(self, mesh):
-        super().__init__()
-        self.mesh = mesh
+    def surface(result, report):
+        result['surface'] = extract_surface(result.pop('vtk_grid'))
+        del result['mesh']
+
+    return [("读取网格", 6, read), ("转换网格", 2, convert), ("提取头部表面", 2, surface)]
+
+
+def field_result_stages(npy_path, field_cache):
+    """结果页的加载阶段：头部表面已在读取受试者网格时提取，这里只读取电场结果"""
+    def points(result, report):
+        result['points'] = field_cache.load(npy_path)
+    return [("读取电场结果", 3, points)]
 
-    def run(self):
-        vtk_grid = meshio_to_vtk_unstructured_grid(self.mesh)
-        self.finished.emit(vtk_grid)
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -264,11 +371,24 @@ class MainWindow(QMainWindow):
         self.type = None  # tms 还是tes
         self.path = None  # 当下所需文件的显示路径
         self.subpath = None
-        self.mesh = None
+        self.head_surface = None  # (受试者路径, 头部表面)，结果页之间共享
+        self.loading_dialog = None
+
+        # TMS 与 TES 共用的受试者网格 LRU 缓存，键为 self.path
+        self.mesh_lru = ByteBudgetLRU(MESH_LRU_MAX_BYTES)
+        # 结果页电场点云缓存，键为结果目录
+        self.field_cache = FieldPointCache(FIELD_CACHE_MAX_BYTES)
+
+        # 所有后台加载都经由同一管线：同键请求合并，可取消，按阶段报告进度
+        self.loader = LoadPipeline(self)
+        self.page_request = None  # 正在为新页面加载的数据（受试者网格或电场结果）
+        self.prefetch_request = None  # 受试者数据预取
+        self.field_request = None  # 结果页切换刺激配置
 
         # 第一个界面参数
         self.canvas = None
         self.nii_viewer = None
+        self.nii_viewer_choice = None
         self.sex = None
         self.age = None
         self.nii = None
@@ -282,6 +402,13 @@ class MainWindow(QMainWindow):
         self.coil_size = None
         self.result_button = None
 
+        # 结果页参数
+        self.result_vtk_viewer = None
+        self.result_combos = []
+        self.analysis_widget = None
+        self.analysis_worker = None  # 当前结果目录的分析计算
+        self.analysis_workers = set()  # 包括已取消但尚未退出的计算线程
+
         # 绑定按钮点击事件
         self.btn1.clicked.connect(lambda: self.set_type("tms"))
         self.btn1.clicked.connect(self.show_nii_view)
@@ -295,6 +422,67 @@ class MainWindow(QMainWindow):
         self.btn1.show()
         self.btn2.show()
 
+        # 状态栏显示进程内存与页面数，用于确认反复导航后内存保持稳定
+        self.memory_label = QLabel()
+        self.statusBar().addPermanentWidget(self.memory_label)
+        self.memory_timer = QTimer(self)
+        self.memory_timer.timeout.connect(self.update_memory_readout)
+        self.memory_timer.start(MEMORY_READOUT_INTERVAL_MS)
+        self.update_memory_readout()
+
+    def closeEvent(self, event):
+        """关闭窗口时停止所有后台加载与预取，排队中的读取不再执行，避免退出时等待"""
+        self.loader.cancel_all()
+        self.cancel_analysis_worker()
+        self.field_cache.shutdown(wait=False, cancel_futures=True)
+        super().closeEvent(event)
+
+    def update_memory_readout(self):
+        text = f"内存: {format_memory(process_rss_bytes())} | 页面: {self.stack.count()}"
+        fps = self.nii_viewer.scroll_fps if self.nii_viewer is not None else None
+        if fps is not None:
+            text += f" | 切片刷新: {fps:.0f} fps"
+        self.memory_label.setText(text)
+
+    def push_page(self, page_widget, level):
+        """把页面放到第 level 层并显示，先释放该层及更深层的旧页面"""
+        self.truncate_pages(level)
+        self.stack.addWidget(page_widget)
+        self.stack.setCurrentWidget(page_widget)
+        self.update_memory_readout()
+
+    def go_back(self):
+        self.go_to_page(self.stack.currentIndex() - 1)
+
+    def go_to_page(self, index):
+        """返回较浅的页面；更深的页面已无法再到达，随即释放"""
+        self.stack.setCurrentIndex(index)
+        self.truncate_pages(index + 1)
+        self.update_memory_readout()
+
+    def truncate_pages(self, level):
+        while self.stack.count() > level:
+            page = self.stack.widget(self.stack.count() - 1)
+            self.stack.removeWidget(page)
+            self.release_page_refs(page)
+            dispose_page(page)
+
+    def release_page_refs(self, page):
+        """清除指向被释放页面内控件的属性，避免继续使用已销毁的对象"""
+        if self.canvas is not None and page.isAncestorOf(self.canvas):
+            self.nii_viewer = None
+        for name in ('canvas', 'sex', 'age', 'nii', 'nii_viewer_choice', 'show_button', 'next_button',
+                     'vtk_viewer', 'coil_type', 'coil_target', 'coil_size', 'result_button',
+                     'result_vtk_viewer', 'analysis_widget'):
+            widget = getattr(self, name, None)
+            if widget is not None and page.isAncestorOf(widget):
+                setattr(self, name, None)
+        if any(page.isAncestorOf(combo) for combo in self.result_combos):
+            self.result_combos = []
+            self.cancel_analysis_worker()
+            self.loader.cancel(self.field_request)
+            self.field_request = None
+
     def set_type(self,typeStr):
         self.type = typeStr
 
@@ -367,7 +555,7 @@ class MainWindow(QMainWindow):
         back_btn = QPushButton("←")
         back_btn.setFixedSize(30, 30)
         back_btn.setStyleSheet("font-size: 16px; font-weight: bold; padding: 0;")
-        back_btn.clicked.connect(lambda: self.stack.setCurrentIndex(0))
+        back_btn.clicked.connect(lambda: self.go_to_page(PAGE_HOME))
 
         title_label = QLabel(title_text)
         title_label.setStyleSheet("font-size: 18px; font-weight: bold;")
@@ -410,6 +598,20 @@ class MainWindow(QMainWindow):
         self.nii.addItems(["sub_01", "sub_02", "sub_03"])
         left_layout.addWidget(self.nii)
 
+        viewerlabel = QLabel("显示方式:")
+        left_layout.addWidget(viewerlabel)
+
+        self.nii_viewer_choice = QComboBox()
+        self.nii_viewer_choice.addItems([NII_VIEWER_MATPLOTLIB, NII_VIEWER_VTK])
+        left_layout.addWidget(self.nii_viewer_choice)
+        # 已显示影像时切换显示方式立即重绘
+        self.nii_viewer_choice.currentTextChanged.connect(
+            lambda _: self.update_plot() if self.nii_viewer is not None else None)
+
+        # 选择变化后，之前启动的预取不再需要
+        for combo in (self.sex, self.age, self.nii):
+            combo.currentTextChanged.connect(self.cancel_subject_prefetch)
+
         # 按钮区域
         left_layout.addStretch()
 
@@ -446,8 +648,7 @@ class MainWindow(QMainWindow):
             self.next_button.clicked.connect(self.show_tes_view)
 
         # 加入堆栈并切换页面
-        self.stack.addWidget(page_widget)
-        self.stack.setCurrentWidget(page_widget)
+        self.push_page(page_widget, PAGE_NII)
 
     def update_nii_path(self):
 
@@ -476,42 +677,142 @@ class MainWindow(QMainWindow):
             age_file_map.get(age_choice),
             nii_file_map.get(nii_choice)
         )
+        self.start_subject_prefetch(self.path)
+
+    def start_subject_prefetch(self, path):
+        """
+        后台预取受试者网格，网格就绪后再预热组织模型；已在预取同一受试者时不重复启动。
+        网格与组织模型分为两个任务，点击“下一步”时只需等待网格任务
+        """
+        if self.prefetch_request is not None and self.prefetch_request.key[1] == path:
+            return
+        self.cancel_subject_prefetch()
+        if path in self.mesh_lru:
+            self.start_tissue_prefetch(path)
+        else:
+            self.prefetch_request = self.loader.request(
+                ('subject', path), subject_mesh_stages(path),
+                lambda result, error: self.on_subject_prefetched(path, result, error))
+
+    def start_tissue_prefetch(self, path):
+        self.prefetch_request = self.loader.request(
+            ('tissues', path), tissue_surface_stages(path),
+            lambda result, error: self.on_tissues_prefetched())
+
+    def cancel_subject_prefetch(self):
+        """选择变化时取消预取；用户已点击“下一步”加入同一任务时，任务继续运行"""
+        self.loader.cancel(self.prefetch_request)
+        self.prefetch_request = None
+
+    def cancel_tissue_prefetch(self):
+        """组织模型页面自己并行加载各组织，打开页面时不再需要预热"""
+        if self.prefetch_request is not None and self.prefetch_request.key[0] == 'tissues':
+            self.cancel_subject_prefetch()
+
+    def on_subject_prefetched(self, path, result, error):
+        self.prefetch_request = None
+        if error is None and 'surface' in result:
+            self.cache_subject_surface(path, result['surface'])
+            # 用户已点击“下一步”时由页面加载组织模型
+            if self.page_request is None:
+                self.start_tissue_prefetch(path)
+
+    def on_tissues_prefetched(self):
+        self.prefetch_request = None
+
+    def cache_subject_surface(self, path, surface):
+        if path not in self.mesh_lru:
+            self.mesh_lru.put(path, surface, surface.GetActualMemorySize() * 1024)
+            print(f"头部表面已缓存: {path} {self.mesh_lru.stats()}")
 
     def update_plot(self):
         # 生成新的图像
         nii_path = os.path.join(self.path, "sub-control.nii.gz")
-        self.nii_viewer = nii_view.begin(nii_path)  # 返回的是 ScrollSliceViewer 实例
-        new_canvas = FigureCanvas(self.nii_viewer.fig)
+        if self.nii_viewer_choice.currentText() == NII_VIEWER_VTK:
+            self.nii_viewer = nii_vtk_view.begin(nii_path)  # VtkSliceViewer 本身就是控件
+            new_canvas = self.nii_viewer
+        else:
+            self.nii_viewer = nii_view.begin(nii_path)  # 返回的是 ScrollSliceViewer 实例
+            new_canvas = FigureCanvas(self.nii_viewer.fig)
 
         # 替换旧的 canvas
         layout = self.stack.currentWidget().layout()
         layout.replaceWidget(self.canvas, new_canvas)
-        self.canvas.deleteLater()  # 删除旧的空白或旧图
+        dispose_page(self.canvas)  # 删除旧的空白或旧图，并关闭其 pyplot 图形
         self.canvas = new_canvas
         self.canvas.show()
+        if isinstance(self.nii_viewer, nii_vtk_view.VtkSliceViewer):
+            self.nii_viewer.vtk_widget.Initialize()
 
     def show_tms_view(self):
+        self.load_subject_mesh(self.tms_on_mesh_loaded)
 
-        self.loading_dialog = LoadingDialog("正在读取数据")
-        self.loading_dialog.show()
-        msh_path = os.path.join(self.path, "sub-control.msh")
-
-        self.mesh_thread = MeshReaderThread(msh_path)  # 传递路径而不是mesh对象
-        self.mesh_thread.finished.connect(self.set_mesh)
-        self.mesh_thread.finished.connect(self.tms_on_read_finished)
-
-        self.mesh_thread.start()
-
-    def set_mesh(self):
-        self.mesh = self.mesh_thread.mesh
-
-    def tms_on_read_finished(self):
-        self.mesh_thread2 = MeshLoaderThread(self.mesh)
-        self.mesh_thread2.finished.connect(self.tms_on_mesh_loaded)
-        self.mesh_thread2.start()
+    def load_subject_mesh(self, on_loaded):
+        """
+        读取当前受试者的网格并提取头部表面，完成后以表面调用 on_loaded。
+        已在 LRU 缓存中的受试者直接复用；后台预取正在读取该受试者时加入其任务，不重复读取。
+        """
+        path = self.path
+        cached = self.mesh_lru.get(path)
+        if cached is not None:
+            print(f"头部表面内存缓存命中: {path} {self.mesh_lru.stats()}")
+            self.cancel_tissue_prefetch()
+            on_loaded(cached)
+            return
 
-    def tms_on_mesh_loaded(self, vtk_grid):
-        self.loading_dialog.close()
+        # 重复点击时不再重复请求，完成后只创建一个页面
+        if self.page_request is not None and self.loader.is_loading(self.page_request.key):
+            return
+        self.show_loading_dialog("正在读取数据")
+        self.page_request = self.loader.request(
+            ('subject', path), subject_mesh_stages(path),
+            lambda result, error: self.on_subject_mesh_loaded(path, result, error, on_loaded),
+            self.on_load_progress)
+
+    def on_subject_mesh_loaded(self, path, result, error, on_loaded):
+        self.page_request = None
+        if error is not None or 'surface' not in result:
+            print(f"读取受试者网格失败: {path} {error}")
+            self.close_loading_dialog()
+            self.show_load_error("读取受试者网格失败", f"{path}\n{error}")
+            return
+        surface = result['surface']
+        self.cache_subject_surface(path, surface)
+        self.cancel_tissue_prefetch()
+        self.start_upload_stage(lambda: on_loaded(surface))
+
+    def show_load_error(self, text, detail):
+        """后台加载失败时提示用户，不创建页面"""
+        msg = QMessageBox(self)
+        msg.setIcon(QMessageBox.Icon.Warning)
+        msg.setText(text)
+        msg.setInformativeText(detail)
+        msg.setWindowTitle("加载失败")
+        msg.exec()
+
+    def show_loading_dialog(self, text):
+        if self.loading_dialog is None:
+            self.loading_dialog = LoadingDialog(text)
+            self.loading_dialog.show()
+
+    def on_load_progress(self, percent, stage):
+        if self.loading_dialog is not None:
+            self.loading_dialog.set_progress(percent * BACKGROUND_PROGRESS_SHARE / 100, stage)
+
+    def start_upload_stage(self, build):
+        """后台阶段完成后进入上传阶段：先刷新进度条，再在下一轮事件循环中创建页面和 actor"""
+        if self.loading_dialog is not None:
+            self.loading_dialog.set_progress(BACKGROUND_PROGRESS_SHARE, "上传到渲染器")
+        QTimer.singleShot(0, build)
+
+    def close_loading_dialog(self):
+        if self.loading_dialog is not None:
+            self.loading_dialog.set_progress(100)
+            self.loading_dialog.close()
+            self.loading_dialog = None
+
+    def tms_on_mesh_loaded(self, surface):
+        self.head_surface = (self.path, surface)
         # 创建页面容器
         page_widget = QWidget()
         page_widget.setStyleSheet("background-color: #f5f5f7;")
@@ -575,7 +876,7 @@ class MainWindow(QMainWindow):
         back_btn = QPushButton("←")
         back_btn.setFixedSize(30, 30)
         back_btn.setStyleSheet("font-size: 16px; font-weight: bold; padding: 0;")
-        back_btn.clicked.connect(lambda: self.stack.setCurrentIndex(self.stack.currentIndex() - 1))
+        back_btn.clicked.connect(self.go_back)
 
         title_label = QLabel("TMS 刺激配置")
         title_label.setStyleSheet("font-size: 18px; font-weight: bold;")
@@ -646,13 +947,16 @@ class MainWindow(QMainWindow):
         self.result_button.clicked.connect(self.show_result_view)
 
         # 加入堆栈并切换页面
-        self.stack.addWidget(page_widget)
-        self.stack.setCurrentWidget(page_widget)
+        self.push_page(page_widget, PAGE_CONFIG)
+        self.close_loading_dialog()
 
     def set_tms_result_path(self):
-        type_choice = self.coil_type.currentText()
-        target_choice = self.coil_target.currentText()
-        size_choice = self.coil_size.currentText()
+        self.subpath = self.tms_result_path(self.coil_type.currentText(),
+                                           self.coil_target.currentText(),
+                                           self.coil_size.currentText())
+
+    def tms_result_path(self, type_choice, target_choice, size_choice):
+        """由 TMS 参数组合得到电场结果目录"""
 
         type_file_map = {
             "bf70": "Deymed_70BF",
@@ -673,33 +977,18 @@ class MainWindow(QMainWindow):
             "10.00x1e6 A/s": "npy_outputs"
         }
 
-        self.subpath = os.path.join(
+        return os.path.join(
             self.path,
             type_file_map.get(type_choice),
             target_file_map.get(target_choice),
             size_file_map.get(size_choice)
         )
-        print("set finished")
 
     def show_tes_view(self):
+        self.load_subject_mesh(self.tes_on_mesh_loaded)
 
-        self.loading_dialog = LoadingDialog("正在读取数据")
-        self.loading_dialog.show()
-        msh_path = os.path.join(self.path, "sub-control.msh")
-
-        self.mesh_thread = MeshReaderThread(msh_path)  # 传递路径而不是mesh对象
-        self.mesh_thread.finished.connect(self.set_mesh)
-        self.mesh_thread.finished.connect(self.tes_on_read_finished)
-
-        self.mesh_thread.start()
-
-    def tes_on_read_finished(self):
-        self.mesh_thread2 = MeshLoaderThread(self.mesh)
-        self.mesh_thread2.finished.connect(self.tes_on_mesh_loaded)
-        self.mesh_thread2.start()
-
-    def tes_on_mesh_loaded(self, vtk_grid):
-        self.loading_dialog.close()
+    def tes_on_mesh_loaded(self, surface):
+        self.head_surface = (self.path, surface)
 
         # 创建页面容器
         page_widget = QWidget()
@@ -764,7 +1053,7 @@ class MainWindow(QMainWindow):
         back_btn = QPushButton("←")
         back_btn.setFixedSize(30, 30)
         back_btn.setStyleSheet("font-size: 16px; font-weight: bold; padding: 0;")
-        back_btn.clicked.connect(lambda: self.stack.setCurrentIndex(self.stack.currentIndex() - 1))
+        back_btn.clicked.connect(self.go_back)
 
         title_label = QLabel("TES 刺激配置")
         title_label.setStyleSheet("font-size: 18px; font-weight: bold;")
@@ -834,13 +1123,16 @@ class MainWindow(QMainWindow):
         self.result_button.clicked.connect(self.show_result_view)
 
         # 加入堆栈并切换页面
-        self.stack.addWidget(page_widget)
-        self.stack.setCurrentWidget(page_widget)
+        self.push_page(page_widget, PAGE_CONFIG)
+        self.close_loading_dialog()
 
     def set_tes_result_path(self):
-        type_choice = self.coil_type.currentText()
-        target_choice = self.coil_target.currentText()
-        size_choice = self.coil_size.currentText()
+        self.subpath = self.tes_result_path(self.coil_type.currentText(),
+                                           self.coil_target.currentText(),
+                                           self.coil_size.currentText())
+
+    def tes_result_path(self, type_choice, target_choice, size_choice):
+        """由 TES 参数组合得到电场结果目录"""
 
         type_file_map = {
             "4.00 mm": "thickness-4",
@@ -861,13 +1153,18 @@ class MainWindow(QMainWindow):
             "10.00x1e6 A/s": "npy_outputs"
         }
 
-        self.subpath = os.path.join(
+        return os.path.join(
             self.path,
             target_file_map.get(target_choice),
             type_file_map.get(type_choice),
             size_file_map.get(size_choice)
         )
 
+    def result_path(self, type_choice, target_choice, size_choice):
+        if self.type == "tms":
+            return self.tms_result_path(type_choice, target_choice, size_choice)
+        return self.tes_result_path(type_choice, target_choice, size_choice)
+
     def show_result_view(self):
         """
         展示结果界面，左边是VTK模型，右边是图表和文字信息
@@ -880,26 +1177,32 @@ class MainWindow(QMainWindow):
             print("错误：尚未设置结果路径")
             return
 
-        # 加载网格文件
-        msh_path = os.path.join(self.path, "sub-control.msh")
         npy_path = self.subpath
 
+        if self.page_request is not None and self.loader.is_loading(self.page_request.key):
+            return
         # 显示加载对话框
-        self.loading_dialog = LoadingDialog("正在加载模型和计算结果...")
-        self.loading_dialog.show()
-
-        # 创建线程加载网格
-
-        self.mesh_thread = MeshResultLoaderThread(self.mesh,npy_path)
-        self.mesh_thread.finished.connect(self.on_result_mesh_loaded)
-        self.mesh_thread.start()
+        self.show_loading_dialog("正在加载模型和计算结果...")
+        path = self.path
+        self.page_request = self.loader.request(
+            ('field', npy_path), field_result_stages(npy_path, self.field_cache),
+            lambda result, error: self.on_field_result_loaded(path, result, error),
+            self.on_load_progress)
+
+    def on_field_result_loaded(self, path, result, error):
+        self.page_request = None
+        if error is not None or result.get('points') is None:
+            self.close_loading_dialog()
+            self.show_load_error("读取电场结果失败", f"{self.subpath}\n{error}")
+            return
+        self.start_upload_stage(
+            lambda: self.on_result_mesh_loaded(path, result.get('points')))
 
-    def on_result_mesh_loaded(self, vtk_grid):
+    def on_result_mesh_loaded(self, path, points):
         """
-        网格加载完成后的回调函数，整合analysis_npy.py的分析功能
+        电场点云加载完成后的回调函数，整合analysis_npy.py的分析功能；
+        头部表面使用刺激配置页读取受试者时提取的 self.head_surface
         """
-        self.loading_dialog.close()
-
 
         # 创建主页面容器
         page_widget = QWidget()
@@ -914,7 +1217,10 @@ class MainWindow(QMainWindow):
 
         # 创建MeshViewer实例
         self.result_vtk_viewer = MeshViewer(None)
-        self.result_vtk_viewer.set_vtk_grid_max(vtk_grid)
+        if self.head_surface is not None and self.head_surface[0] == path:
+            self.result_vtk_viewer.set_head_geometry(self.head_surface[1])
+        if points is not None:
+            self.result_vtk_viewer.set_field_points(points)
         self.result_vtk_viewer.vtk_widget.Initialize()
         self.result_vtk_viewer.setStyleSheet("background-color: white; border-radius: 5px;")
         vtk_layout.addWidget(self.result_vtk_viewer)
@@ -983,7 +1289,7 @@ class MainWindow(QMainWindow):
         back_btn = QPushButton("←")
         back_btn.setFixedSize(30, 30)
         back_btn.setStyleSheet("font-size: 16px; font-weight: bold; padding: 0;")
-        back_btn.clicked.connect(lambda: self.stack.setCurrentIndex(self.stack.currentIndex() - 1))
+        back_btn.clicked.connect(self.go_back)
 
         title_label = QLabel("调控结果分析")
         title_label.setStyleSheet("font-size: 18px; font-weight: bold;")
@@ -1009,330 +1315,26 @@ class MainWindow(QMainWindow):
         params_title.setStyleSheet("font-weight: bold; font-size: 16px;")
         params_layout.addWidget(params_title)
 
-        if self.type == "tms":
-            type_text = f"线圈类型: {self.coil_type.currentText()}"
-        else:
-            type_text = f"电极厚度: {self.coil_type.currentText()}"
-
-        type_label = QLabel(type_text)
-        target_label = QLabel(f"刺激靶点: {self.coil_target.currentText()}")
-        size_label = QLabel(f"强度: {self.coil_size.currentText()}")
-
-        params_layout.addWidget(type_label)
-        params_layout.addWidget(target_label)
-        params_layout.addWidget(size_label)
+        # 参数下拉框与配置页同步，修改后在当前页面原地切换电场结果
+        type_text = "线圈类型:" if self.type == "tms" else "电极厚度:"
+        self.result_combos = []
+        for text, source in ((type_text, self.coil_type), ("刺激靶点:", self.coil_target),
+                             ("强度:", self.coil_size)):
+            row = QHBoxLayout()
+            row.addWidget(QLabel(text))
+            combo = QComboBox()
+            combo.addItems([source.itemText(i) for i in range(source.count())])
+            combo.setCurrentText(source.currentText())
+            combo.setStyleSheet("padding: 3px 8px; color: black; background: white;")
+            combo.currentTextChanged.connect(self.switch_result_config)
+            row.addWidget(combo, 1)
+            params_layout.addLayout(row)
+            self.result_combos.append(combo)
 
         info_layout.addWidget(params_widget)
 
-        # 创建选项卡，用于展示不同的图表
-        tab_widget = QTabWidget()
-        tab_widget.setStyleSheet("font-size: 14px;")
-        print("正在加载")
-        # 加载和分析数据
-        try:
-            # 从analysis_npy.py导入需要的函数
-            from analysis_npy import load_field_data, compute_statistics
-            print("加载成功")
-            # 加载电场数据
-            base_dir = self.subpath
-            tissue_data = {}
-            for tissue_name, filename in {
-                'Scalp': 'e_scalp.npy',
-                'Bone': 'e_bone.npy',
-                'CSF': 'e_csf.npy',
-                'Gray Matter': 'e_gray_matter.npy',
-                'White Matter': 'e_white_matter.npy'
-            }.items():
-                full_path = os.path.join(base_dir, filename)
-                tissue_data[tissue_name] = load_field_data(full_path)
-
-            # 创建分布图选项卡
-            dist_tab = QWidget()
-            dist_layout = QVBoxLayout(dist_tab)
-            dist_fig = Figure(figsize=(5, 4), dpi=100)
-            dist_canvas = FigureCanvas(dist_fig)
-            dist_layout.addWidget(dist_canvas)
-
-            # 绘制分布图
-            ax = dist_fig.add_subplot(111)
-            plotted = False
-            bins = 50
-            for label, arr in tissue_data.items():
-                if arr.size == 0:
-                    continue
-                ax.hist(arr[:, 3], bins=bins, alpha=0.5, density=False, label=label)
-                plotted = True
-
-            if plotted:
-                ax.set_xlabel('E-field magnitude (V/m)')
-                ax.set_ylabel('Voxel count')
-                ax.legend()
-                dist_fig.tight_layout()
-            else:
-                no_data_label = QLabel("没有可用的组织数据")
-                no_data_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                dist_layout.addWidget(no_data_label)
-
-            # 创建3D散点图选项卡
-            scatter_tab = QWidget()
-            scatter_layout = QVBoxLayout(scatter_tab)
-            scatter_fig = Figure(figsize=(5, 4), dpi=100)
-            scatter_canvas = FigureCanvas(scatter_fig)
-            scatter_layout.addWidget(scatter_canvas)
-
-            # 选择灰质数据进行3D可视化
-            gray_matter = tissue_data.get('Gray Matter', np.empty((0, 4)))
-            if gray_matter.size > 0:
-                # 抽样以提高性能
-                subsample = 5000
-                n_points = min(subsample, gray_matter.shape[0])
-                indices = np.random.choice(gray_matter.shape[0], n_points, replace=False)
-                sample = gray_matter[indices]
-
-                ax = scatter_fig.add_subplot(111, projection='3d')
-                sc = ax.scatter(sample[:, 0], sample[:, 1], sample[:, 2],
-                                c=sample[:, 3], cmap='jet', s=5, marker='o')
-                cbar = scatter_fig.colorbar(sc, ax=ax)
-                cbar.set_label('E-field (V/m)')
-                ax.set_xlabel('X (mm)')
-                ax.set_ylabel('Y (mm)')
-                ax.set_zlabel('Z (mm)')
-                scatter_fig.tight_layout()
-            else:
-                no_data_label = QLabel("没有可用的灰质数据")
-                no_data_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                scatter_layout.addWidget(no_data_label)
-
-
-            # 创建3D散点图选项卡
-            scatter_w_tab = QWidget()
-            scatter_w_layout = QVBoxLayout(scatter_w_tab)
-            scatter_w_fig = Figure(figsize=(5, 4), dpi=100)
-            scatter_w_canvas = FigureCanvas(scatter_w_fig)
-            scatter_w_layout.addWidget(scatter_w_canvas)
-
-            # 选择白质数据进行3D可视化
-            white_matter = tissue_data.get('White Matter', np.empty((0, 4)))
-            if white_matter.size > 0:
-                # 抽样以提高性能
-                subsample = 5000
-                n_points = min(subsample, white_matter.shape[0])
-                indices = np.random.choice(white_matter.shape[0], n_points, replace=False)
-                sample = white_matter[indices]
-
-                ax = scatter_w_fig.add_subplot(111, projection='3d')
-                sc = ax.scatter(sample[:, 0], sample[:, 1], sample[:, 2],
-                                c=sample[:, 3], cmap='jet', s=5, marker='o')
-                cbar = scatter_w_fig.colorbar(sc, ax=ax)
-                cbar.set_label('E-field (V/m)')
-                ax.set_xlabel('X (mm)')
-                ax.set_ylabel('Y (mm)')
-                ax.set_zlabel('Z (mm)')
-                scatter_w_fig.tight_layout()
-            else:
-                no_data_label = QLabel("没有可用的白质数据")
-                no_data_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                scatter_w_layout.addWidget(no_data_label)
-
-
-
-            # 创建3D散点图选项卡
-            scatter_scalp_tab = QWidget()
-            scatter_scalp_layout = QVBoxLayout(scatter_scalp_tab)
-            scatter_scalp_fig = Figure(figsize=(5, 4), dpi=100)
-            scatter_scalp_canvas = FigureCanvas(scatter_scalp_fig)
-            scatter_scalp_layout.addWidget(scatter_scalp_canvas)
-
-            # 选择头皮数据进行3D可视化
-            scalp_matter = tissue_data.get('Scalp', np.empty((0, 4)))
-            if scalp_matter.size > 0:
-                # 抽样以提高性能
-                subsample = 5000
-                n_points = min(subsample, scalp_matter.shape[0])
-                indices = np.random.choice(scalp_matter.shape[0], n_points, replace=False)
-                sample = scalp_matter[indices]
-
-                ax = scatter_scalp_fig.add_subplot(111, projection='3d')
-                sc = ax.scatter(sample[:, 0], sample[:, 1], sample[:, 2],
-                                c=sample[:, 3], cmap='jet', s=5, marker='o')
-                cbar = scatter_scalp_fig.colorbar(sc, ax=ax)
-                cbar.set_label('E-field (V/m)')
-                ax.set_xlabel('X (mm)')
-                ax.set_ylabel('Y (mm)')
-                ax.set_zlabel('Z (mm)')
-                scatter_scalp_fig.tight_layout()
-            else:
-                no_data_label = QLabel("没有可用的头皮数据")
-                no_data_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                scatter_scalp_layout.addWidget(no_data_label)
-
-
-            # 创建3D散点图选项卡
-            scatter_csf_tab = QWidget()
-            scatter_csf_layout = QVBoxLayout(scatter_csf_tab)
-            scatter_csf_fig = Figure(figsize=(5, 4), dpi=100)
-            scatter_csf_canvas = FigureCanvas(scatter_csf_fig)
-            scatter_csf_layout.addWidget(scatter_csf_canvas)
-
-            # 选择脑脊液数据进行3D可视化
-            csf_matter = tissue_data.get('CSF', np.empty((0, 4)))
-            if csf_matter.size > 0:
-                # 抽样以提高性能
-                subsample = 5000
-                n_points = min(subsample, csf_matter.shape[0])
-                indices = np.random.choice(csf_matter.shape[0], n_points, replace=False)
-                sample = csf_matter[indices]
-
-                ax = scatter_csf_fig.add_subplot(111, projection='3d')
-                sc = ax.scatter(sample[:, 0], sample[:, 1], sample[:, 2],
-                                c=sample[:, 3], cmap='jet', s=5, marker='o')
-                cbar = scatter_csf_fig.colorbar(sc, ax=ax)
-                cbar.set_label('E-field (V/m)')
-                ax.set_xlabel('X (mm)')
-                ax.set_ylabel('Y (mm)')
-                ax.set_zlabel('Z (mm)')
-                scatter_csf_fig.tight_layout()
-            else:
-                no_data_label = QLabel("没有可用的脑脊液数据")
-                no_data_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                scatter_csf_layout.addWidget(no_data_label)
-
-
-
-
-
-            # 创建切片图选项卡
-            slice_tab = QWidget()
-            slice_layout = QVBoxLayout(slice_tab)
-            slice_fig = Figure(figsize=(5, 4), dpi=100)
-            slice_canvas = FigureCanvas(slice_fig)
-            slice_layout.addWidget(slice_canvas)
-
-            if gray_matter.size > 0:
-                from scipy.interpolate import griddata
-                # 找到Z轴中点
-                mid_z = 0.5 * (np.min(gray_matter[:, 2]) + np.max(gray_matter[:, 2]))
-                # 设置容差
-                tol = (np.max(gray_matter[:, 2]) - np.min(gray_matter[:, 2])) / 300
-                slice_pts = gray_matter[np.abs(gray_matter[:, 2] - mid_z) < tol]
-
-                if slice_pts.shape[0] > 0:
-                    ax = slice_fig.add_subplot(111)
-                    xi, yi = slice_pts[:, 0], slice_pts[:, 1]
-                    zi = slice_pts[:, 3]
-
-                    grid_size = 200
-                    xi_lin = np.linspace(np.min(xi), np.max(xi), grid_size)
-                    yi_lin = np.linspace(np.min(yi), np.max(yi), grid_size)
-                    X, Y = np.meshgrid(xi_lin, yi_lin)
-
-                    try:
-                        Z = griddata((xi, yi), zi, (X, Y), method='cubic')
-                        im = ax.imshow(Z.T, extent=(xi_lin[0], xi_lin[-1], yi_lin[0], yi_lin[-1]),
-                                       origin='lower', aspect='auto', cmap='jet')
-                        slice_fig.colorbar(im, ax=ax, label='E-field (V/m)')
-                        ax.set_xlabel('X (mm)')
-                        ax.set_ylabel('Y (mm)')
-                        ax.set_title(f'Z = {mid_z:.2f} mm ')
-                        slice_fig.tight_layout()
-                    except Exception:
-                        ax.text(0.5, 0.5, '切片插值失败', ha='center', va='center',
-                                transform=ax.transAxes)
-                else:
-                    ax = slice_fig.add_subplot(111)
-                    ax.text(0.5, 0.5, '在选定平面没有足够的数据点', ha='center', va='center',
-                            transform=ax.transAxes)
-            else:
-                no_data_label = QLabel("没有可用的组织数据")
-                no_data_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                slice_layout.addWidget(no_data_label)
-
-            # 创建摘要统计选项卡
-            stats_tab = QWidget()
-            stats_layout = QVBoxLayout(stats_tab)
-
-            stats_label = QLabel("各组织电场强度统计 (V/m)")
-            stats_label.setStyleSheet("font-family: 'DejaVu Sans'; font-weight: bold; margin-bottom: 10px; color: black;")
-            stats_layout.addWidget(stats_label)
-
-            from PyQt6.QtWidgets import QTableWidget, QTableWidgetItem
-            stats_table = QTableWidget()
-            stats_table.setColumnCount(5)
-            stats_table.setHorizontalHeaderLabels(["组织", "最小值", "最大值", "平均值", "标准差"])
-            stats_table.setRowCount(len(tissue_data))
-            stats_table.setStyleSheet("""
-                QTableWidget {
-                    font-family: 'DejaVu Sans';
-                    color: black;
-                }
-                QTableWidget::item {
-                    color: black;
-                    font-family: 'DejaVu Sans';
-                }
-                QHeaderView::section {
-                    color: black;
-                    font-family: 'DejaVu Sans';
-                }
-            """)
-
-            for i, (name, arr) in enumerate(tissue_data.items()):
-                stats = compute_statistics(arr)
-                item0 = QTableWidgetItem(name)
-                item1 = QTableWidgetItem(f"{stats['min']:.3e}" if not np.isnan(stats['min']) else "N/A")
-                item2 = QTableWidgetItem(f"{stats['max']:.3e}" if not np.isnan(stats['max']) else "N/A")
-                item3 = QTableWidgetItem(f"{stats['mean']:.3e}" if not np.isnan(stats['mean']) else "N/A")
-                item4 = QTableWidgetItem(f"{stats['std']:.3e}" if not np.isnan(stats['std']) else "N/A")
-                for item in [item0, item1, item2, item3, item4]:
-                    item.setForeground(Qt.GlobalColor.black)
-                    item.setFont(stats_table.font())
-                stats_table.setItem(i, 0, item0)
-                stats_table.setItem(i, 1, item1)
-                stats_table.setItem(i, 2, item2)
-                stats_table.setItem(i, 3, item3)
-                stats_table.setItem(i, 4, item4)
-
-            stats_table.resizeColumnsToContents()
-            stats_layout.addWidget(stats_table)
-
-            # 添加各选项卡到QTabWidget
-            tab_widget.addTab(stats_tab, "统计")
-            tab_widget.addTab(dist_tab, "电场分布")
-            tab_widget.addTab(scatter_tab, "灰质")
-            tab_widget.addTab(scatter_w_tab, "白质")
-            tab_widget.addTab(scatter_scalp_tab, "头皮")
-            tab_widget.addTab(scatter_csf_tab, "脑脊液")
-            tab_widget.addTab(slice_tab, "切片")
-
-        except Exception as e:
-            import traceback
-            print(f"加载分析数据出错: {e}")
-            print(traceback.format_exc())
-
-            # 出现错误时显示简单的图表
-            figure = Figure(figsize=(5, 3), dpi=100)
-            canvas = FigureCanvas(figure)
-
-            ax = figure.add_subplot(111)
-            bars = ax.bar(['表层皮质', '大脑中部', '深部组织'], [120, 80, 30],
-                          color=['#4a86e8', '#4a86e8', '#4a86e8'])
-            ax.set_ylabel('电场强度 (V/m)')
-            ax.set_title('不同深度的电场强度分布')
-            for bar in bars:
-                height = bar.get_height()
-                ax.text(bar.get_x() + bar.get_width() / 2., height + 5,
-                        f'{int(height)}',
-                        ha='center', va='bottom', fontsize=9)
-
-            figure.tight_layout()
-            info_layout.addWidget(canvas)
-
-            # 添加错误提示
-            error_label = QLabel("无法加载详细分析数据，显示模拟数据")
-            error_label.setStyleSheet("color: red; margin-top: 10px;")
-            info_layout.addWidget(error_label)
-        else:
-            # 添加选项卡到布局
-            info_layout.addWidget(tab_widget)
+        self.analysis_widget = self.build_analysis_widget(self.subpath)
+        info_layout.addWidget(self.analysis_widget)
 
 
 
@@ -1350,12 +1352,268 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(info_panel)  # 右侧信息面板
 
         # 将页面添加到堆栈并显示
-        self.stack.addWidget(page_widget)
-        self.stack.setCurrentWidget(page_widget)
+        self.push_page(page_widget, PAGE_RESULT)
+        self.close_loading_dialog()
+
+        self.prefetch_neighbour_configs()
+
+    def switch_result_config(self):
+        """
+        结果页参数变化时调用：头部几何与页面保持不变，只替换电场点云；
+        点云已预取时同步完成，否则经加载管线读取
+        """
+        for combo, source in zip(self.result_combos, (self.coil_type, self.coil_target, self.coil_size)):
+            source.setCurrentText(combo.currentText())
+        self.subpath = self.result_path(*(combo.currentText() for combo in self.result_combos))
+
+        npy_path = self.subpath
+        # 上一次尚未完成的切换已无意义
+        self.loader.cancel(self.field_request)
+        self.field_request = None
+        points = self.field_cache.get(npy_path)
+        if points is not None:
+            self.on_result_config_loaded(npy_path, points)
+            return
+        self.field_request = self.loader.request(
+            ('field', npy_path), field_result_stages(npy_path, self.field_cache),
+            lambda result, error: self.on_result_config_loaded(npy_path, result.get('points'), error))
+
+    def on_result_config_loaded(self, npy_path, points, error=None):
+        if npy_path != self.subpath or self.result_vtk_viewer is None:
+            return  # 读取期间参数又被修改或结果页已释放，丢弃过期结果
+        if error is not None:
+            self.show_load_error("读取电场结果失败", f"{npy_path}\n{error}")
+            return
+        if points is not None:
+            start = time.perf_counter()
+            self.result_vtk_viewer.set_field_points(points)
+            self.result_vtk_viewer.vtk_widget.GetRenderWindow().Render()
+            print(f"切换刺激配置: {(time.perf_counter() - start) * 1000:.1f} ms {npy_path}")
+
+        # 分析图表较慢，放到三维视图刷新之后再重建
+        QTimer.singleShot(0, lambda: self.replace_analysis_widget(npy_path))
+        self.prefetch_neighbour_configs()
+
+    def replace_analysis_widget(self, npy_path):
+        if npy_path != self.subpath or self.analysis_widget is None:
+            return
+        new_widget = self.build_analysis_widget(npy_path)
+        self.analysis_widget.parentWidget().layout().replaceWidget(self.analysis_widget, new_widget)
+        dispose_page(self.analysis_widget)
+        self.analysis_widget = new_widget
+
+    def prefetch_neighbour_configs(self):
+        """后台预取同一线圈（电极）和强度下其他靶点的电场结果"""
+        type_choice, target_choice, size_choice = (combo.currentText() for combo in self.result_combos)
+        targets = [self.coil_target.itemText(i) for i in range(self.coil_target.count())]
+        paths = [self.result_path(type_choice, target, size_choice) for target in targets
+                 if target != target_choice]
+        self.field_cache.prefetch([p for p in paths if os.path.isdir(p)])
+
+    def build_analysis_widget(self, base_dir):
+        """
+        构建结果目录 base_dir 的分析选项卡（统计、分布、散点、切片）。
+        数据由 AnalysisWorker 在后台计算，各选项卡先显示占位提示，
+        数据就绪且第一次切换到该页时才绘制图形
+        """
+        # 创建选项卡，用于展示不同的图表
+        tab_widget = LazyTabWidget()
+        tab_widget.setStyleSheet("font-size: 14px;")
+        pages = {
+            'stats': tab_widget.add_lazy_tab("统计"),
+            'dist': tab_widget.add_lazy_tab("电场分布"),
+        }
+        for title, tissue_name in (("灰质", 'Gray Matter'), ("白质", 'White Matter'),
+                                   ("头皮", 'Scalp'), ("脑脊液", 'CSF')):
+            pages[('sample', tissue_name)] = tab_widget.add_lazy_tab(title)
+        pages['slice'] = tab_widget.add_lazy_tab("切片")
+
+        # 上一个结果目录的计算已无意义
+        self.cancel_analysis_worker()
+        print("正在加载")
+        worker = AnalysisWorker(base_dir)
+        worker.product_ready.connect(
+            lambda key, value: self.on_analysis_product(tab_widget, pages, key, value))
+        worker.failed.connect(lambda message: self.on_analysis_failed(tab_widget))
+        worker.finished.connect(lambda: self.analysis_workers.discard(worker))
+        self.analysis_workers.add(worker)
+        self.analysis_worker = worker
+        worker.start()
+        return tab_widget
+
+    def cancel_analysis_worker(self):
+        if self.analysis_worker is not None:
+            self.analysis_worker.requestInterruption()
+            self.analysis_worker = None
+
+    def on_analysis_product(self, tab_widget, pages, key, value):
+        """GUI 线程：把后台算好的数据交给对应选项卡"""
+        if tab_widget is not self.analysis_widget:
+            return  # 页面已被替换或释放
+        if key == 'summaries':
+            tab_widget.set_builder(pages['stats'], lambda layout: self.build_stats_tab(layout, value))
+            tab_widget.set_builder(pages['dist'], lambda layout: self.build_distribution_tab(layout, value))
+        elif key == 'slice':
+            tab_widget.set_builder(pages['slice'], lambda layout: self.build_slice_tab(layout, value))
+        elif key in pages:
+            missing_text = {'Gray Matter': "没有可用的灰质数据", 'White Matter': "没有可用的白质数据",
+                            'Scalp': "没有可用的头皮数据", 'CSF': "没有可用的脑脊液数据"}[key[1]]
+            tab_widget.set_builder(pages[key], lambda layout: self.build_scatter_tab(layout, value, missing_text))
+
+    def on_analysis_failed(self, tab_widget):
+        if tab_widget is not self.analysis_widget:
+            return
+        error_widget = self.build_analysis_error_widget()
+        tab_widget.parentWidget().layout().replaceWidget(tab_widget, error_widget)
+        dispose_page(tab_widget)
+        self.analysis_widget = error_widget
+
+    def build_analysis_error_widget(self):
+        """无法加载分析数据时显示的模拟图表与错误提示"""
+        error_widget = QWidget()
+        error_layout = QVBoxLayout(error_widget)
+        error_layout.setContentsMargins(0, 0, 0, 0)
+        figure = Figure(figsize=(5, 3), dpi=100)
+        canvas = FigureCanvas(figure)
+
+        ax = figure.add_subplot(111)
+        bars = ax.bar(['表层皮质', '大脑中部', '深部组织'], [120, 80, 30],
+                      color=['#4a86e8', '#4a86e8', '#4a86e8'])
+        ax.set_ylabel('电场强度 (V/m)')
+        ax.set_title('不同深度的电场强度分布')
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width() / 2., height + 5,
+                    f'{int(height)}',
+                    ha='center', va='bottom', fontsize=9)
+
+        figure.tight_layout()
+        error_layout.addWidget(canvas)
+
+        # 添加错误提示
+        error_label = QLabel("无法加载详细分析数据，显示模拟数据")
+        error_label.setStyleSheet("color: red; margin-top: 10px;")
+        error_layout.addWidget(error_label)
+        return error_widget
+
+    def build_stats_tab(self, stats_layout, tissue_summaries):
+        from PyQt6.QtWidgets import QTableWidget, QTableWidgetItem
+        from field_store import SIDECAR_PERCENTILES
+
+        stats_label = QLabel("各组织电场强度统计 (V/m)")
+        stats_label.setStyleSheet("font-family: 'DejaVu Sans'; font-weight: bold; margin-bottom: 10px; color: black;")
+        stats_layout.addWidget(stats_label)
+
+        stats_table = QTableWidget()
+        stat_keys = ['min', 'max', 'mean', 'std']
+        stats_table.setColumnCount(1 + len(stat_keys) + len(SIDECAR_PERCENTILES))
+        stats_table.setHorizontalHeaderLabels(["组织", "最小值", "最大值", "平均值", "标准差"]
+                                              + [f"P{p}" for p in SIDECAR_PERCENTILES])
+        stats_table.setRowCount(len(tissue_summaries))
+        stats_table.setStyleSheet("""
+            QTableWidget {
+                font-family: 'DejaVu Sans';
+                color: black;
+            }
+            QTableWidget::item {
+                color: black;
+                font-family: 'DejaVu Sans';
+            }
+            QHeaderView::section {
+                color: black;
+                font-family: 'DejaVu Sans';
+            }
+        """)
+
+        for i, (name, stats) in enumerate(tissue_summaries.items()):
+            values = [stats[k] for k in stat_keys] + [stats['percentiles'][str(p)] for p in SIDECAR_PERCENTILES]
+            items = [QTableWidgetItem(name)] + [
+                QTableWidgetItem(f"{v:.3e}" if not np.isnan(v) else "N/A") for v in values]
+            for col, item in enumerate(items):
+                item.setForeground(Qt.GlobalColor.black)
+                item.setFont(stats_table.font())
+                stats_table.setItem(i, col, item)
+
+        stats_table.resizeColumnsToContents()
+        stats_layout.addWidget(stats_table)
+
+    def build_distribution_tab(self, dist_layout, tissue_summaries):
+        dist_fig = Figure(figsize=(5, 4), dpi=100)
+        dist_canvas = FigureCanvas(dist_fig)
+        dist_layout.addWidget(dist_canvas)
+
+        # 绘制分布图
+        ax = dist_fig.add_subplot(111)
+        plotted = False
+        for label, summary in tissue_summaries.items():
+            if summary['count'] == 0:
+                continue
+            edges = summary['hist_edges']
+            ax.hist(edges[:-1], bins=edges, weights=summary['hist_counts'],
+                    alpha=0.5, density=False, label=label)
+            plotted = True
+
+        if plotted:
+            ax.set_xlabel('E-field magnitude (V/m)')
+            ax.set_ylabel('Voxel count')
+            ax.legend()
+            dist_fig.tight_layout()
+        else:
+            no_data_label = QLabel("没有可用的组织数据")
+            no_data_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            dist_layout.addWidget(no_data_label)
+
+    def build_scatter_tab(self, scatter_layout, sample, missing_text):
+        """组织电场的 3D 散点图；sample 为后台抽样得到的至多 5000 个点"""
+        scatter_fig = Figure(figsize=(5, 4), dpi=100)
+        scatter_canvas = FigureCanvas(scatter_fig)
+        scatter_layout.addWidget(scatter_canvas)
+
+        if sample.size > 0:
+            ax = scatter_fig.add_subplot(111, projection='3d')
+            sc = ax.scatter(sample[:, 0], sample[:, 1], sample[:, 2],
+                            c=sample[:, 3], cmap='jet', s=5, marker='o')
+            cbar = scatter_fig.colorbar(sc, ax=ax)
+            cbar.set_label('E-field (V/m)')
+            ax.set_xlabel('X (mm)')
+            ax.set_ylabel('Y (mm)')
+            ax.set_zlabel('Z (mm)')
+            scatter_fig.tight_layout()
+        else:
+            no_data_label = QLabel(missing_text)
+            no_data_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            scatter_layout.addWidget(no_data_label)
+
+    def build_slice_tab(self, slice_layout, slice_result):
+        """灰质 Z 轴中间平面的插值切片；slice_result 为后台计算的 analysis_npy.slice_at_mid_z 结果"""
+        slice_fig = Figure(figsize=(5, 4), dpi=100)
+        slice_canvas = FigureCanvas(slice_fig)
+        slice_layout.addWidget(slice_canvas)
+
+        if slice_result is not None:
+            ax = slice_fig.add_subplot(111)
+            if slice_result['reason'] is None:
+                im = ax.imshow(slice_result['Z'].T, extent=slice_result['extent'],
+                               origin='lower', aspect='auto', cmap='jet')
+                slice_fig.colorbar(im, ax=ax, label='E-field (V/m)')
+                ax.set_xlabel('X (mm)')
+                ax.set_ylabel('Y (mm)')
+                ax.set_title(f"Z = {slice_result['mid_z']:.2f} mm ")
+                slice_fig.tight_layout()
+            elif slice_result['reason'] == 'interp_failed':
+                ax.text(0.5, 0.5, '切片插值失败', ha='center', va='center',
+                        transform=ax.transAxes)
+            else:
+                ax.text(0.5, 0.5, '在选定平面没有足够的数据点', ha='center', va='center',
+                        transform=ax.transAxes)
+        else:
+            no_data_label = QLabel("没有可用的组织数据")
+            no_data_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            slice_layout.addWidget(no_data_label)
 
     def export_report(self):
         """导出分析报告到PDF或其他格式"""
-        from PyQt6.QtWidgets import QFileDialog, QMessageBox
+        from PyQt6.QtWidgets import QFileDialog
 
         try:
             # 打开文件保存对话框
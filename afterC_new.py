@@ -4,9 +4,16 @@ from PyQt6.QtWidgets import QWidget, QVBoxLayout
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 import os
 import glob
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from vtkmodules.util.numpy_support import numpy_to_vtk
 
+from beforeC_new import numpy_to_vtk_points, mesh_cell_blocks, set_cell_blocks, vertex_cell_array
+from field_store import open_field_results
+from surface_pipeline import extract_surface
+from mesh_cache import ByteBudgetLRU
+
 
 
 os.environ['VTK_SILENCE_GET_VOID_POINTER_WARNINGS'] = '1'
@@ -21,6 +28,17 @@ vtk.vtkOutputWindow.SetInstance(output)
 
 
 def load_all_data(npy_dir):
+    # 优先使用列式 e_fields.efd，其中组织的选择顺序与下方旧格式一致
+    results = open_field_results(npy_dir)
+    if results is not None:
+        for name in ('gray_matter', 'white_matter'):
+            if results.has(name):
+                field = results.field(name)
+                return field[:, :3], field[:, 3]
+        if results.header['n_total'] > 0:
+            field = results.field()
+            return field[:, :3], field[:, 3]
+
     # 优先查找 e_gray_matter.npy
     gray_matter_file = os.path.join(npy_dir, 'e_gray_matter.npy')
     white_matter_file = os.path.join(npy_dir, 'e_white_matter.npy')
@@ -37,57 +55,50 @@ def load_all_data(npy_dir):
     if not files:
         raise FileNotFoundError(f"No e_*.npy files found in {npy_dir}")
 
+    # 以只读内存映射方式打开，数据在真正被访问时才读入
     coords_list = []
     e_list = []
     for f in files:
-        data = np.load(f)
+        data = np.load(f, mmap_mode='r')
         if data.size == 0:
             continue
         coords_list.append(data[:, :3])
         e_list.append(data[:, 3])
 
+    if len(coords_list) == 1:
+        # 单个文件直接返回映射视图，避免 vstack 复制整份数据
+        return coords_list[0], e_list[0]
     coords = np.vstack(coords_list)
     e_vals = np.concatenate(e_list)
     return coords, e_vals
 
 
 def meshio_to_vtk_unstructured_grid_max(mesh,npy_dir):
+    """
+    将头部网格与 npy 电场采样点合并为一个 vtkUnstructuredGrid：
+    网格点在前、采样点在后，每个采样点一个 vertex 单元，随后是 tetra / triangle 单元。
+    点坐标、单元与标量 "e" 均由 numpy 批量生成，不再逐点插入。
+    """
     print(npy_dir)
-    points = vtk.vtkPoints()
-    for p in mesh.points:
-        points.InsertNextPoint(p[:3])
-    base_id = points.GetNumberOfPoints()
-
-    ugrid = vtk.vtkUnstructuredGrid()
-    print("11111")
     coords, e_vals = load_all_data(npy_dir)
-    print(coords,e_vals)
-    pidlist = [points.InsertNextPoint(p[:3]) for p in coords]
-    ugrid.SetPoints(points)
-
-    for i, p in enumerate(coords):
-        vertex = vtk.vtkVertex()
-        vertex.GetPointIds().SetId(0, pidlist[i])
-        ugrid.InsertNextCell(vertex.GetCellType(), vertex.GetPointIds())
-
-    if "tetra" in mesh.cells_dict:
-        for cell in mesh.cells_dict["tetra"]:
-            tetra = vtk.vtkTetra()
-            for i in range(4):
-                tetra.GetPointIds().SetId(i, cell[i])
-            ugrid.InsertNextCell(tetra.GetCellType(), tetra.GetPointIds())
-
-    if "triangle" in mesh.cells_dict:
-        for cell in mesh.cells_dict["triangle"]:
-            triangle = vtk.vtkTriangle()
-            for i in range(3):
-                triangle.GetPointIds().SetId(i, cell[i])
-            ugrid.InsertNextCell(triangle.GetCellType(), triangle.GetPointIds())
-
-    total_points = points.GetNumberOfPoints()
-    full_vals = np.zeros(total_points)
+    base_id = len(mesh.points)
+    total_points = base_id + len(coords)
+
+    # 一次分配合并后的坐标与标量，网格点处电场为 0
+    all_points = np.empty((total_points, 3), dtype=np.float64)
+    all_points[:base_id] = mesh.points[:, :3]
+    all_points[base_id:] = coords
+    full_vals = np.empty(total_points, dtype=np.float64)
+    full_vals[:base_id] = 0.0
     full_vals[base_id:] = e_vals
-    vtk_array = numpy_to_vtk(full_vals, deep=True)
+
+    ugrid = vtk.vtkUnstructuredGrid()
+    ugrid.SetPoints(numpy_to_vtk_points(all_points))
+
+    vertex_ids = np.arange(base_id, total_points).reshape(-1, 1)
+    set_cell_blocks(ugrid, [(vtk.VTK_VERTEX, vertex_ids)] + mesh_cell_blocks(mesh))
+
+    vtk_array = numpy_to_vtk(full_vals, deep=False)
     vtk_array.SetName("e")
     ugrid.GetPointData().AddArray(vtk_array)
     ugrid.GetPointData().SetScalars(vtk_array)
@@ -95,6 +106,78 @@ def meshio_to_vtk_unstructured_grid_max(mesh,npy_dir):
     return ugrid
 
 
+def load_field_points(npy_dir):
+    """
+    只读取电场结果，生成点云 vtkPolyData：每个采样点一个顶点单元，标量为 "e"。
+    与 meshio_to_vtk_unstructured_grid_max 不同，不包含头部网格，可与已有头部几何叠加显示。
+    """
+    coords, e_vals = load_all_data(npy_dir)
+    polydata = vtk.vtkPolyData()
+    polydata.SetPoints(numpy_to_vtk_points(coords))
+    polydata.SetVerts(vertex_cell_array(len(coords)))
+
+    vtk_array = numpy_to_vtk(np.ascontiguousarray(e_vals, dtype=np.float64), deep=False)
+    vtk_array.SetName("e")
+    polydata.GetPointData().AddArray(vtk_array)
+    polydata.GetPointData().SetScalars(vtk_array)
+    return polydata
+
+
+class FieldPointCache:
+    """
+    按结果目录缓存 load_field_points 的点云，并可在后台线程预取相邻的刺激配置。
+    load 遇到正在预取的目录时等待该任务完成，不会重复读取。
+    """
+
+    def __init__(self, max_bytes, max_workers=2):
+        self.lru = ByteBudgetLRU(max_bytes)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = {}  # 结果目录 -> Future
+        self._lock = threading.Lock()
+
+    def get(self, npy_dir):
+        """已缓存时返回点云，否则返回 None（不触发读取）"""
+        return self.lru.get(npy_dir)
+
+    def load(self, npy_dir):
+        """返回点云，必要时在当前线程读取；可在工作线程中调用"""
+        points = self.lru.get(npy_dir)
+        if points is not None:
+            return points
+        with self._lock:
+            future = self._pending.get(npy_dir)
+        if future is not None:
+            return future.result()
+        return self._load(npy_dir)
+
+    def prefetch(self, npy_dirs):
+        """后台预取尚未缓存、也未在读取中的结果目录"""
+        submitted = []
+        with self._lock:
+            for npy_dir in npy_dirs:
+                if npy_dir in self._pending or npy_dir in self.lru:
+                    continue
+                future = self._executor.submit(self._load, npy_dir)
+                self._pending[npy_dir] = future
+                submitted.append((npy_dir, future))
+        # 已完成的 Future 会立即执行回调，因此在释放锁之后再注册
+        for npy_dir, future in submitted:
+            future.add_done_callback(lambda _, d=npy_dir: self._forget(d))
+
+    def _forget(self, npy_dir):
+        with self._lock:
+            self._pending.pop(npy_dir, None)
+
+    def _load(self, npy_dir):
+        points = load_field_points(npy_dir)
+        self.lru.put(npy_dir, points, points.GetActualMemorySize() * 1024)
+        return points
+
+    def shutdown(self, wait=False, cancel_futures=True):
+        """停止预取：默认丢弃排队中的读取且不等待正在进行的读取（窗口关闭时调用）"""
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
 class MeshViewer(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -114,6 +197,11 @@ class MeshViewer(QWidget):
         self.renderer.SetOcclusionRatio(0.1)
         self.renderer.SetBackground(0.1, 0.1, 0.2)
 
+        # 共享头部几何与电场点云的 actor（见 set_head_geometry / set_field_points）
+        self.head_actor = None
+        self.field_actor = None
+        self.scalar_bar = None
+
     def load_mesh(self, mesh_filename,npy_dir):
         """通过文件名加载网格"""
         mesh = meshio.read(mesh_filename)
@@ -124,63 +212,25 @@ class MeshViewer(QWidget):
         """直接设置VTK网格数据"""
         # 清除旧的actors
         self.renderer.RemoveAllViewProps()
+        self.head_actor = None
+        self.field_actor = None
 
-        mapper = vtk.vtkDataSetMapper()
-        mapper.SetInputData(vtk_grid)
+        # 只渲染外表面与电场采样点，避免每次更新重新提取表面、绘制内部面片
+        surface = extract_surface(vtk_grid)
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputData(surface)
         mapper.SelectColorArray("e")
         mapper.SetScalarRange(vtk_grid.GetPointData().GetScalars().GetRange())
         mapper.SetColorModeToMapScalars()
         mapper.ScalarVisibilityOn()
 
-        lut = vtk.vtkLookupTable()
-        lut.SetNumberOfTableValues(256)
         min_val, max_val = vtk_grid.GetPointData().GetScalars().GetRange()
-        lut.SetTableRange(min_val, max_val * 0.3)
-        lut.Build()
-
-        for i in range(256):
-            t = i / 255.0
-            if t < 0.05:
-                r, g, b = 1.0, 1.0, 1.0
-                t = 0.2
-            elif t < 0.5:
-                f = (t - 0.05) / 0.45
-                r = g = f
-                b = 1.0 - f
-                t = 1
-            else:
-                f = (t - 0.5) / 0.5
-                r = 1.0
-                g = 1.0 - f
-                b = 0.0
-                t = 1
-            lut.SetTableValue(i, r, g, b, t)
-
+        lut = build_field_lut(min_val, max_val)
         mapper.SetLookupTable(lut)
         mapper.SetUseLookupTableScalarRange(True)
 
-        scalar_bar = vtk.vtkScalarBarActor()
-        scalar_bar.SetLookupTable(lut)
-        scalar_bar.SetTitle("Object Type")
-        scalar_bar.SetNumberOfLabels(4)
-
-        # 自定义颜色条位置和样式
-        scalar_bar.SetPosition(0.02, 0.1)  # 左侧
-        scalar_bar.SetWidth(0.08)
-        scalar_bar.SetHeight(0.8)
-
-        # 设置文本属性
-        scalar_bar.GetTitleTextProperty().SetColor(1, 1, 1)
-        scalar_bar.GetTitleTextProperty().SetFontSize(18)
-        scalar_bar.GetTitleTextProperty().SetBold(True)
-        scalar_bar.GetLabelTextProperty().SetColor(1, 1, 1)
-        scalar_bar.GetLabelTextProperty().SetFontSize(14)
-
-        # 设置颜色条方向为垂直
-        scalar_bar.SetOrientationToVertical()
-
-        self.renderer.AddActor2D(scalar_bar)
-
+        self.scalar_bar = build_scalar_bar(lut)
+        self.renderer.AddViewProp(self.scalar_bar)
 
         actor = vtk.vtkActor()
         actor.SetMapper(mapper)
@@ -189,4 +239,106 @@ class MeshViewer(QWidget):
         actor.GetProperty().BackfaceCullingOff()
 
         self.renderer.AddActor(actor)
-        self.renderer.ResetCamera()
\ No newline at end of file
+        self.renderer.ResetCamera()
+
+    def set_head_geometry(self, surface):
+        """
+        显示头部表面（与 set_vtk_grid_max 中电场为 0 处的颜色一致：白色、不透明度 0.2）。
+        surface 来自刺激配置页已构建的受试者网格，同一受试者只需设置一次。
+        """
+        if self.head_actor is None:
+            mapper = vtk.vtkPolyDataMapper()
+            mapper.ScalarVisibilityOff()
+            self.head_actor = vtk.vtkActor()
+            self.head_actor.SetMapper(mapper)
+            self.head_actor.GetProperty().SetColor(1.0, 1.0, 1.0)
+            self.head_actor.GetProperty().SetOpacity(0.2)
+            self.head_actor.GetProperty().SetInterpolationToPhong()
+            self.head_actor.GetProperty().BackfaceCullingOff()
+            self.renderer.AddActor(self.head_actor)
+        self.head_actor.GetMapper().SetInputData(surface)
+        self.renderer.ResetCamera()
+
+    def set_field_points(self, points):
+        """显示或替换电场点云（load_field_points 的结果），头部几何保持不变"""
+        min_val, max_val = points.GetPointData().GetScalars().GetRange()
+        # 与合并网格时一致：网格点处电场为 0，颜色范围从 0 起算
+        min_val = min(min_val, 0.0)
+        lut = build_field_lut(min_val, max_val)
+
+        if self.field_actor is None:
+            mapper = vtk.vtkPolyDataMapper()
+            mapper.SelectColorArray("e")
+            mapper.SetColorModeToMapScalars()
+            mapper.ScalarVisibilityOn()
+            mapper.SetUseLookupTableScalarRange(True)
+            self.field_actor = vtk.vtkActor()
+            self.field_actor.SetMapper(mapper)
+            self.field_actor.GetProperty().SetOpacity(1)
+            self.renderer.AddActor(self.field_actor)
+            self.scalar_bar = build_scalar_bar(lut)
+            self.renderer.AddViewProp(self.scalar_bar)
+
+        mapper = self.field_actor.GetMapper()
+        mapper.SetInputData(points)
+        mapper.SetScalarRange(min_val, max_val)
+        mapper.SetLookupTable(lut)
+        self.scalar_bar.SetLookupTable(lut)
+
+    def dispose(self):
+        """页面被移除时释放渲染资源：清空渲染器并关闭渲染窗口（OpenGL 上下文与显存）"""
+        self.renderer.RemoveAllViewProps()
+        self.head_actor = None
+        self.field_actor = None
+        self.scalar_bar = None
+        self.vtk_widget.Finalize()
+
+
+def build_field_lut(min_val, max_val):
+    """电场颜色映射：低值白色半透明，中段蓝→黄，高段黄→红；上限取最大值的 30%"""
+    lut = vtk.vtkLookupTable()
+    lut.SetNumberOfTableValues(256)
+    lut.SetTableRange(min_val, max_val * 0.3)
+    lut.Build()
+
+    for i in range(256):
+        t = i / 255.0
+        if t < 0.05:
+            r, g, b = 1.0, 1.0, 1.0
+            t = 0.2
+        elif t < 0.5:
+            f = (t - 0.05) / 0.45
+            r = g = f
+            b = 1.0 - f
+            t = 1
+        else:
+            f = (t - 0.5) / 0.5
+            r = 1.0
+            g = 1.0 - f
+            b = 0.0
+            t = 1
+        lut.SetTableValue(i, r, g, b, t)
+    return lut
+
+
+def build_scalar_bar(lut):
+    scalar_bar = vtk.vtkScalarBarActor()
+    scalar_bar.SetLookupTable(lut)
+    scalar_bar.SetTitle("Object Type")
+    scalar_bar.SetNumberOfLabels(4)
+
+    # 自定义颜色条位置和样式
+    scalar_bar.SetPosition(0.02, 0.1)  # 左侧
+    scalar_bar.SetWidth(0.08)
+    scalar_bar.SetHeight(0.8)
+
+    # 设置文本属性
+    scalar_bar.GetTitleTextProperty().SetColor(1, 1, 1)
+    scalar_bar.GetTitleTextProperty().SetFontSize(18)
+    scalar_bar.GetTitleTextProperty().SetBold(True)
+    scalar_bar.GetLabelTextProperty().SetColor(1, 1, 1)
+    scalar_bar.GetLabelTextProperty().SetFontSize(14)
+
+    # 设置颜色条方向为垂直
+    scalar_bar.SetOrientationToVertical()
+    return scalar_bar
@@ -4,6 +4,9 @@ import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from scipy.interpolate import griddata
 
+from field_store import load_legacy_equivalent, load_stats_sidecar, write_stats_sidecar, SIDECAR_BINS
+from field_stats import field_statistics, summarize_field
+
 # --------------------------------------------------------------
 # TMS Electric Field Analysis
 # --------------------------------------------------------------
@@ -15,35 +18,141 @@ from scipy.interpolate import griddata
 # 3D scatter is oriented to face the voxel with maximum E-field.
 # --------------------------------------------------------------
 
-def load_field_data(path: str) -> np.ndarray:
+# Display label -> legacy per-tissue file name of a result directory
+RESULT_TISSUE_FILES = {
+    'Scalp': 'e_scalp.npy',
+    'Bone': 'e_bone.npy',
+    'CSF': 'e_csf.npy',
+    'Gray Matter': 'e_gray_matter.npy',
+    'White Matter': 'e_white_matter.npy',
+}
+
+def load_field_data(path: str, mmap_mode: str = 'r') -> np.ndarray:
     """
     Load electric field data from a .npy file.
+    By default the file is memory-mapped read-only, so only the pages
+    touched by statistics, subsampling or slicing are actually read.
+    Pass mmap_mode=None to load the whole array into RAM.
+    If the directory holds a columnar e_fields.efd containing the same
+    tissue, that float32 view is returned instead of the legacy file.
     Returns empty array if missing or malformed.
     """
+    columnar = load_legacy_equivalent(path)
+    if columnar is not None:
+        return columnar if mmap_mode is not None else np.array(columnar)
     if not os.path.isfile(path):
         print(f"Warning: Data file not found: {path}")
         return np.empty((0, 4))
-    data = np.load(path)
+    data = np.load(path, mmap_mode=mmap_mode)
     if data.ndim != 2 or data.shape[1] != 4:
         print(f"Warning: Unexpected data shape in {path}: {data.shape}")
         return np.empty((0, 4))
     return data
 
 
+def subsample_field(field: np.ndarray, n: int, rng=None) -> np.ndarray:
+    """
+    Random subsample of at most n rows without replacement.
+    Indices are sorted so memory-mapped data is read front to back
+    and only the pages holding the sampled rows are touched.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    n_points = min(n, field.shape[0])
+    indices = np.sort(rng.choice(field.shape[0], n_points, replace=False))
+    return np.asarray(field[indices])
+
+
 def compute_statistics(field: np.ndarray) -> dict:
     """
     Compute basic statistics of the electric field magnitudes.
+    Single chunked pass over field[:, 3] without the percentile sketch,
+    so memory-mapped inputs of any size are processed with bounded memory.
     Returns NaN for empty data.
     """
-    e_vals = field[:, 3]
-    if e_vals.size == 0:
-        return {k: np.nan for k in ('min', 'max', 'mean', 'std')}
-    return {
-        'min': np.min(e_vals),
-        'max': np.max(e_vals),
-        'mean': np.mean(e_vals),
-        'std': np.std(e_vals),
-    }
+    return field_statistics(field).result()
+
+
+def load_or_compute_summaries(base_dir: str, file_map: dict = None,
+                              bins: int = SIDECAR_BINS) -> dict:
+    """
+    Per-tissue summaries (statistics, percentiles, histogram) keyed by label.
+    Read from the e_stats.json sidecar when it is present and up to date;
+    tissues missing from it are computed from the field data and the
+    sidecar is then rewritten so the next visit is a pure file read.
+    """
+    if file_map is None:
+        file_map = RESULT_TISSUE_FILES
+    names = {label: os.path.splitext(fname)[0][len('e_'):] for label, fname in file_map.items()}
+    cached = load_stats_sidecar(base_dir, bins=bins)
+
+    summaries = {}
+    computed = False
+    for label, fname in file_map.items():
+        name = names[label]
+        if name not in cached:
+            cached[name] = summarize_field(load_field_data(os.path.join(base_dir, fname)), bins=bins)
+            computed = True
+        summaries[label] = cached[name]
+
+    if computed:
+        try:
+            write_stats_sidecar(base_dir, cached, bins=bins)
+        except OSError as e:
+            print(f"Warning: Cannot write statistics sidecar in {base_dir}: {e}")
+    return summaries
+
+
+def slice_at_mid_z(field: np.ndarray, grid_size: int = 200, tol_divisor: int = 300) -> dict:
+    """
+    Cubic griddata interpolation of E-field on the z plane through the
+    middle of the field's z range, ready for imshow(Z.T, extent=extent).
+    'reason' is None on success, 'no_points' when no voxel lies within
+    the tolerance of the plane, or 'interp_failed' when griddata raises.
+    """
+    z = np.asarray(field[:, 2])
+    mid_z = 0.5 * (np.min(z) + np.max(z))
+    tol = (np.max(z) - np.min(z)) / tol_divisor
+    slice_pts = np.asarray(field[np.abs(z - mid_z) < tol])
+    result = {'mid_z': mid_z, 'Z': None, 'extent': None, 'reason': None}
+    if slice_pts.shape[0] == 0:
+        result['reason'] = 'no_points'
+        return result
+
+    xi, yi, zi = slice_pts[:, 0], slice_pts[:, 1], slice_pts[:, 3]
+    xi_lin = np.linspace(np.min(xi), np.max(xi), grid_size)
+    yi_lin = np.linspace(np.min(yi), np.max(yi), grid_size)
+    X, Y = np.meshgrid(xi_lin, yi_lin)
+    try:
+        result['Z'] = griddata((xi, yi), zi, (X, Y), method='cubic')
+    except Exception as e:
+        print(f"Cubic interpolation failed at z={mid_z:.2f}: {e}")
+        result['reason'] = 'interp_failed'
+        return result
+    result['extent'] = (xi_lin[0], xi_lin[-1], yi_lin[0], yi_lin[-1])
+    return result
+
+
+def iter_result_products(base_dir: str, file_map: dict = None, sample_size: int = 5000):
+    """
+    Yield (key, value) analysis products for the results page, in tab order:
+    'summaries' (see load_or_compute_summaries), then ('sample', label)
+    with a subsample of at most sample_size rows per tissue (empty (0, 4)
+    when missing), then 'slice' (slice_at_mid_z of gray matter, or None
+    without gray matter data). Intended to run in a worker thread so each
+    product can be plotted as soon as it is ready.
+    """
+    if file_map is None:
+        file_map = RESULT_TISSUE_FILES
+    yield 'summaries', load_or_compute_summaries(base_dir, file_map)
+
+    tissues = {label: load_field_data(os.path.join(base_dir, fname)) for label, fname in file_map.items()}
+    for label, field in tissues.items():
+        sample = subsample_field(field, sample_size) if field.size > 0 else np.empty((0, 4))
+        yield ('sample', label), sample
+
+    gray = tissues.get('Gray Matter', np.empty((0, 4)))
+    yield 'slice', slice_at_mid_z(gray) if gray.size > 0 else None
 
 
 def plot_histogram(data: dict, bins: int = 50) -> None:
@@ -80,9 +189,7 @@ def plot_3d_scatter(field: np.ndarray, title: str, subsample: int = 5000) -> Non
         print(f"Skipping 3D scatter for {title}: no data.")
         return
     # Subsample for performance
-    n_points = min(subsample, field.shape[0])
-    indices = np.random.choice(field.shape[0], n_points, replace=False)
-    sample = field[indices]
+    sample = subsample_field(field, subsample)
 
     # Determine max-field voxel from full dataset for orientation
     max_idx = np.argmax(field[:, 3])
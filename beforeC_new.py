@@ -1,7 +1,19 @@
 import meshio
+import numpy as np
 import vtk
 from PyQt6.QtWidgets import QWidget, QVBoxLayout
 from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
+from vtkmodules.util.numpy_support import numpy_to_vtk, numpy_to_vtkIdTypeArray, get_vtk_to_numpy_typemap
+
+
+# meshio 单元名称 -> VTK 单元类型，顺序即插入顺序（先四面体后三角面片）
+MESHIO_VTK_CELL_TYPES = (
+    ("tetra", vtk.VTK_TETRA),
+    ("triangle", vtk.VTK_TRIANGLE),
+)
+
+# 与 vtkIdType 对应的 numpy 整数类型（32 或 64 位取决于 VTK 编译选项）
+VTK_ID_DTYPE = get_vtk_to_numpy_typemap()[vtk.VTK_ID_TYPE]
 
 
 def meshio_to_vtk_unstructured_grid(mesh):
@@ -34,6 +46,74 @@ def meshio_to_vtk_unstructured_grid(mesh):
     return ugrid
 
 
+def numpy_to_vtk_points(coords):
+    """将 (N,3) 坐标数组零拷贝包装为 vtkPoints"""
+    coords = np.ascontiguousarray(coords[:, :3])
+    points = vtk.vtkPoints()
+    points.SetData(numpy_to_vtk(coords, deep=False))
+    return points
+
+
+def mesh_cell_blocks(mesh):
+    """按插入顺序返回 mesh 中受支持的单元块 [(vtk单元类型, (n_cells, n_pts) 数组), ...]"""
+    return [(vtk_type, mesh.cells_dict[name])
+            for name, vtk_type in MESHIO_VTK_CELL_TYPES
+            if name in mesh.cells_dict]
+
+
+def set_cell_blocks(ugrid, blocks):
+    """
+    用 numpy 一次性生成 offsets / connectivity / 单元类型数组，交给 vtkUnstructuredGrid。
+    blocks 为 [(vtk单元类型, (n_cells, n_pts) 点索引数组), ...]，按顺序写入。
+    """
+    blocks = [(vtk_type, np.asarray(cells)) for vtk_type, cells in blocks if len(cells) > 0]
+    n_cells = sum(cells.shape[0] for _, cells in blocks)
+
+    connectivity = np.empty(sum(cells.size for _, cells in blocks), dtype=VTK_ID_DTYPE)
+    offsets = np.empty(n_cells + 1, dtype=VTK_ID_DTYPE)
+    cell_types = np.empty(n_cells, dtype=np.uint8)
+    offsets[0] = 0
+
+    cell_pos = conn_pos = 0
+    for vtk_type, cells in blocks:
+        n, k = cells.shape
+        connectivity[conn_pos:conn_pos + n * k] = cells.ravel()
+        offsets[cell_pos + 1:cell_pos + n + 1] = conn_pos + k * np.arange(1, n + 1, dtype=VTK_ID_DTYPE)
+        cell_types[cell_pos:cell_pos + n] = vtk_type
+        cell_pos += n
+        conn_pos += n * k
+
+    # VTK 9.4 之前 SetData 会把 id 数组浅拷贝进新的 vtkTypeInt64Array，持有 numpy 引用的
+    # 临时包装随即释放，零拷贝会留下悬空指针；因此这两个数组做一次深拷贝
+    cell_array = vtk.vtkCellArray()
+    cell_array.SetData(numpy_to_vtkIdTypeArray(offsets, deep=True),
+                       numpy_to_vtkIdTypeArray(connectivity, deep=True))
+    ugrid.SetCells(numpy_to_vtk(cell_types, deep=False, array_type=vtk.VTK_UNSIGNED_CHAR),
+                   cell_array)
+    return ugrid
+
+
+def vertex_cell_array(n_points, first_id=0):
+    """点 first_id .. first_id+n_points-1 各自构成一个顶点单元的 vtkCellArray"""
+    offsets = np.arange(n_points + 1, dtype=VTK_ID_DTYPE)
+    connectivity = np.arange(first_id, first_id + n_points, dtype=VTK_ID_DTYPE)
+    # 与 set_cell_blocks 相同，id 数组需深拷贝，否则 VTK 9.4 之前会引用已释放的 numpy 内存
+    cell_array = vtk.vtkCellArray()
+    cell_array.SetData(numpy_to_vtkIdTypeArray(offsets, deep=True),
+                       numpy_to_vtkIdTypeArray(connectivity, deep=True))
+    return cell_array
+
+
+def meshio_to_vtk_unstructured_grid_fast(mesh):
+    """
+    meshio_to_vtk_unstructured_grid 的批量版本：点坐标、连接关系与单元类型
+    均由 numpy 一次生成后交给 VTK，结果与逐单元插入完全一致。
+    """
+    ugrid = vtk.vtkUnstructuredGrid()
+    ugrid.SetPoints(numpy_to_vtk_points(mesh.points))
+    return set_cell_blocks(ugrid, mesh_cell_blocks(mesh))
+
+
 class SimpleMeshViewer(QWidget):
     def __init__(self, mesh_filename, parent=None):
         super().__init__(parent)
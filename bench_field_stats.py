@@ -0,0 +1,84 @@
+"""
+bench_field_stats.py
+
+校验并计时 field_stats 的流式统计：
+  - 百分位草图与 np.percentile（method='lower'，即草图所取的秩）的相对误差
+    不超过 PERCENTILE_RELATIVE_ACCURACY；
+  - 按块统计后 merge 的结果与单块一次统计一致；
+  - compute_statistics（不构建草图）与直接的 numpy 归约耗时对比。
+
+用法: python bench_field_stats.py [采样点数量]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from analysis_npy import compute_statistics
+from field_stats import StreamingStats, field_statistics, PERCENTILE_RELATIVE_ACCURACY
+from field_store import SIDECAR_PERCENTILES
+
+
+def make_synthetic_field(n_rows, seed=0):
+    """生成 (n_rows, 4) 的电场数组，第 4 列为对数正态分布的场强"""
+    rng = np.random.default_rng(seed)
+    field = np.empty((n_rows, 4))
+    field[:, :3] = rng.uniform(-100.0, 100.0, size=(n_rows, 3))
+    field[:, 3] = rng.lognormal(mean=-1.0, sigma=1.0, size=n_rows)
+    return field
+
+
+def max_percentile_error(stats, values, percentiles=SIDECAR_PERCENTILES):
+    """草图百分位数相对 np.percentile 的最大相对误差"""
+    errors = []
+    for q in percentiles:
+        exact = np.percentile(values, q, method='lower')
+        errors.append(abs(stats.percentile(q) - exact) / abs(exact))
+    return max(errors)
+
+
+def merged_equals_single(field, chunk_rows):
+    """按 chunk_rows 分块分别统计再合并，与整段一次统计比较"""
+    single = field_statistics(field, chunk_rows=field.shape[0], percentiles=True)
+    parts = [field_statistics(field[start:start + chunk_rows], chunk_rows=chunk_rows, percentiles=True)
+             for start in range(0, field.shape[0], chunk_rows)]
+    merged = StreamingStats.merged(parts)
+    a, b = single.result(), merged.result()
+    return (single.count == merged.count
+            and a['min'] == b['min'] and a['max'] == b['max']
+            and np.isclose(a['mean'], b['mean'], rtol=1e-12, atol=0)
+            and np.isclose(a['std'], b['std'], rtol=1e-9, atol=0)
+            and single.positive_buckets == merged.positive_buckets
+            and single.negative_buckets == merged.negative_buckets
+            and single.zero_count == merged.zero_count)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def numpy_statistics(field):
+    values = field[:, 3]
+    return {'min': np.min(values), 'max': np.max(values), 'mean': np.mean(values), 'std': np.std(values)}
+
+
+if __name__ == '__main__':
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000000
+    field = make_synthetic_field(n_rows)
+    print(f"合成电场: {n_rows} 个采样点")
+
+    sketch = field_statistics(field, percentiles=True)
+    error = max_percentile_error(sketch, field[:, 3])
+    print(f"百分位最大相对误差: {error:.2e} (上限 {PERCENTILE_RELATIVE_ACCURACY:.0e}) "
+          f"{'通过' if error <= PERCENTILE_RELATIVE_ACCURACY else '失败'}")
+    print(f"分块合并与单次统计一致: {merged_equals_single(field, max(n_rows // 7, 1))}")
+
+    baseline, baseline_time = timed(numpy_statistics, field)
+    streaming, streaming_time = timed(compute_statistics, field)
+    _, sketch_time = timed(field_statistics, field, 1 << 20, True)
+    print(f"numpy 归约: {baseline_time:.3f} s")
+    print(f"compute_statistics: {streaming_time:.3f} s  (含百分位草图时 {sketch_time:.3f} s)")
+    print(f"结果一致: {all(np.isclose(baseline[k], streaming[k]) for k in baseline)}")
@@ -0,0 +1,201 @@
+"""
+field_stats.py
+
+电场强度的流式统计：按块遍历 (N,4) 数组（可以是内存映射）的第 4 列，
+单次遍历得到 count / min / max / mean / std（Welford / Chan 合并公式）。
+需要百分位数时（percentiles=True）同时维护对数分桶草图（DDSketch 思路，
+相对误差 PERCENTILE_RELATIVE_ACCURACY）；只要基础统计量时不做分桶，省去额外的 log 与排序。
+
+StreamingStats 只包含普通属性，可被 pickle，因此不同组织或不同工作进程的
+部分结果可以用 merge() 合并。
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from field_store import load_legacy_equivalent, SIDECAR_PERCENTILES, SIDECAR_BINS
+
+# 每块处理的行数：1M 行 float64 约 8 MB，内存占用与数组总长度无关
+DEFAULT_CHUNK_ROWS = 1 << 20
+PERCENTILE_RELATIVE_ACCURACY = 0.001
+# 绝对值小于该值的样本计入零桶
+_ZERO_THRESHOLD = 1e-12
+
+
+class StreamingStats:
+    """可合并的单遍统计累加器"""
+
+    def __init__(self, relative_accuracy=PERCENTILE_RELATIVE_ACCURACY, percentiles=True):
+        self.relative_accuracy = relative_accuracy
+        self.percentiles = percentiles
+        self._log_gamma = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zero_count = 0
+        self.positive_buckets = {}
+        self.negative_buckets = {}
+
+    def update(self, values):
+        """加入一块样本"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        n = values.size
+        if n == 0:
+            return self
+        chunk_mean = float(values.mean())
+        chunk_m2 = float(np.sum((values - chunk_mean) ** 2))
+        self._combine(n, chunk_mean, chunk_m2)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        if not self.percentiles:
+            return self
+
+        magnitudes = np.abs(values)
+        nonzero = magnitudes >= _ZERO_THRESHOLD
+        self.zero_count += int(n - np.count_nonzero(nonzero))
+        self._add_to_buckets(self.positive_buckets, values[nonzero & (values > 0)])
+        self._add_to_buckets(self.negative_buckets, -values[nonzero & (values < 0)])
+        return self
+
+    def merge(self, other):
+        """合并另一个累加器（须使用相同的相对误差）"""
+        if other.relative_accuracy != self.relative_accuracy or other.percentiles != self.percentiles:
+            raise ValueError("无法合并相对误差或百分位设置不同的统计草图")
+        if other.count == 0:
+            return self
+        self._combine(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        for mine, theirs in ((self.positive_buckets, other.positive_buckets),
+                             (self.negative_buckets, other.negative_buckets)):
+            for key, cnt in theirs.items():
+                mine[key] = mine.get(key, 0) + cnt
+        return self
+
+    @classmethod
+    def merged(cls, parts):
+        parts = list(parts)
+        total = cls(parts[0].relative_accuracy, parts[0].percentiles) if parts else cls()
+        for part in parts:
+            total.merge(part)
+        return total
+
+    def _combine(self, n, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    def _add_to_buckets(self, buckets, magnitudes):
+        if magnitudes.size == 0:
+            return
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, cnt in zip(keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + cnt
+
+    def _bucket_value(self, key):
+        gamma = math.exp(self._log_gamma)
+        return 2.0 * gamma ** key / (gamma + 1.0)
+
+    def percentile(self, q):
+        """估计第 q 百分位数（0-100），与 np.percentile 的相对误差不超过 relative_accuracy"""
+        if not self.percentiles:
+            raise ValueError("未启用百分位草图（percentiles=False）")
+        if self.count == 0:
+            return np.nan
+        rank = q / 100.0 * (self.count - 1)
+        # 从最小值开始依次遍历：负数桶（绝对值从大到小）、零桶、正数桶
+        ordered = [(-self._bucket_value(k), c) for k, c in sorted(self.negative_buckets.items(), reverse=True)]
+        ordered.append((0.0, self.zero_count))
+        ordered += [(self._bucket_value(k), c) for k, c in sorted(self.positive_buckets.items())]
+        seen = 0
+        for value, cnt in ordered:
+            seen += cnt
+            if seen > rank:
+                return float(min(max(value, self.min), self.max))
+        return float(self.max)
+
+    def result(self):
+        """与 analysis_npy.compute_statistics 相同的字典：min / max / mean / std"""
+        if self.count == 0:
+            return {k: np.nan for k in ('min', 'max', 'mean', 'std')}
+        return {
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'std': math.sqrt(self.m2 / self.count),
+        }
+
+
+def iter_value_chunks(field, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """按块产出 field[:, 3]，内存映射数组每次只读入一块"""
+    for start in range(0, field.shape[0], chunk_rows):
+        yield np.asarray(field[start:start + chunk_rows, 3])
+
+
+def field_statistics(field, chunk_rows=DEFAULT_CHUNK_ROWS, percentiles=False):
+    """单遍按块统计 (N,4) 电场数组的第 4 列；percentiles=True 时同时构建百分位草图"""
+    stats = StreamingStats(percentiles=percentiles)
+    for chunk in iter_value_chunks(field, chunk_rows):
+        stats.update(chunk)
+    return stats
+
+
+def load_field_for_stats(path):
+    """按 e_<name>.npy 路径取数据：优先同目录 .efd，其次内存映射 .npy，缺失时为空数组"""
+    field = load_legacy_equivalent(path)
+    if field is not None:
+        return field
+    if not os.path.isfile(path):
+        return np.empty((0, 4))
+    return np.load(path, mmap_mode='r')
+
+
+def file_statistics(path, chunk_rows=DEFAULT_CHUNK_ROWS, percentiles=False):
+    """对单个电场文件做流式统计；为顶层函数，可直接交给进程池"""
+    return field_statistics(load_field_for_stats(path), chunk_rows, percentiles)
+
+
+def parallel_file_statistics(paths, max_workers=None, percentiles=False):
+    """在进程池中分别统计多个文件，返回 {路径: StreamingStats}，可再用 StreamingStats.merged 汇总"""
+    paths = list(paths)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        stats = executor.map(file_statistics, paths, [DEFAULT_CHUNK_ROWS] * len(paths),
+                             [percentiles] * len(paths))
+        return dict(zip(paths, stats))
+
+
+def summarize_field(field, bins=SIDECAR_BINS, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    单个组织 (N,4) 电场数组的统计摘要：基础统计量、百分位数与直方图。
+    第一遍流式统计得到取值范围与百分位草图，第二遍按块累加直方图，内存占用与数据量无关。
+    空数组时数值为 NaN、直方图为空列表。
+    """
+    stats = field_statistics(field, chunk_rows, percentiles=True)
+    if stats.count == 0:
+        return {
+            'count': 0,
+            'min': np.nan, 'max': np.nan, 'mean': np.nan, 'std': np.nan,
+            'percentiles': {str(p): np.nan for p in SIDECAR_PERCENTILES},
+            'hist_counts': [], 'hist_edges': [],
+        }
+
+    edges = np.histogram_bin_edges([stats.min, stats.max], bins=bins)
+    counts = np.zeros(bins, dtype=np.int64)
+    for chunk in iter_value_chunks(field, chunk_rows):
+        counts += np.histogram(chunk, bins=edges)[0]
+
+    summary = {'count': stats.count}
+    summary.update({k: float(v) for k, v in stats.result().items()})
+    summary['percentiles'] = {str(p): stats.percentile(p) for p in SIDECAR_PERCENTILES}
+    summary['hist_counts'] = counts.tolist()
+    summary['hist_edges'] = edges.tolist()
+    return summary
@@ -0,0 +1,224 @@
+"""
+field_store.py
+
+列式 float32 电场结果格式（.efd）。一个结果目录只需一个文件 e_fields.efd，
+取代逐组织的 e_*.npy（交错存储的 float64 (N,4) 数组）。
+
+文件布局:
+    8 字节魔数 b'EFIELD01'
+    8 字节小端 uint64：JSON 头长度（含填充）
+    JSON 头，空格填充至 64 字节对齐
+    float32 数据，形状 (4, n_total)：x / y / z / magnE 四列各自连续存放
+
+JSON 头记录所有组织在列中的 offset / count，以及预先计算的 min / max / mean / std。
+读取时整块内存映射，field(name) 返回 (N,4) 的转置视图：接口与旧的 (N,4) 数组一致，
+但 field[:, 3] 是连续内存，统计和绘图只读取需要的那一列。
+
+同目录下的 e_stats.json 是统计量边车文件：每个组织的 min / max / mean / std、
+50/90/99/99.9 百分位数和直方图计数，由导出脚本写出，供结果页直接读取。
+百分位数来自 field_stats 的对数分桶草图（相对误差 PERCENTILE_RELATIVE_ACCURACY），
+版本 1 的边车中是精确百分位数，两者以 STATS_SIDECAR_VERSION 区分，旧版本边车会被重新计算。
+"""
+
+import json
+import os
+import re
+import struct
+
+import numpy as np
+
+FIELD_RESULTS_FILENAME = 'e_fields.efd'
+STATS_SIDECAR_FILENAME = 'e_stats.json'
+# 2: 百分位数改为草图近似值
+STATS_SIDECAR_VERSION = 2
+SIDECAR_PERCENTILES = (50, 90, 99, 99.9)
+SIDECAR_BINS = 50
+MAGIC = b'EFIELD01'
+FORMAT_VERSION = 1
+COLUMNS = ('x', 'y', 'z', 'magnE')
+DATA_ALIGN = 64
+_DTYPE = np.dtype('<f4')
+_LEGACY_NAME = re.compile(r'^e_(.+)\.npy$')
+
+
+def _column_stats(values):
+    if values.size == 0:
+        return {k: None for k in ('min', 'max', 'mean', 'std')}
+    values = values.astype(np.float64)
+    return {
+        'min': float(np.min(values)),
+        'max': float(np.max(values)),
+        'mean': float(np.mean(values)),
+        'std': float(np.std(values)),
+    }
+
+
+def write_field_results(path, tissues):
+    """
+    把 {组织名: (N,4) 数组} 写成一个 .efd 文件。
+    组织名沿用 e_<name>.npy 中的 name，例如 'gray_matter'。
+    """
+    arrays = {name: np.asarray(arr).reshape(-1, 4) for name, arr in tissues.items()}
+    n_total = sum(arr.shape[0] for arr in arrays.values())
+
+    header = {
+        'version': FORMAT_VERSION,
+        'dtype': _DTYPE.str,
+        'columns': list(COLUMNS),
+        'n_total': n_total,
+        'tissues': {},
+    }
+    columns = np.empty((len(COLUMNS), n_total), dtype=_DTYPE)
+    offset = 0
+    for name, arr in arrays.items():
+        count = arr.shape[0]
+        columns[:, offset:offset + count] = arr.T
+        header['tissues'][name] = dict(offset=offset, count=count,
+                                       **_column_stats(columns[3, offset:offset + count]))
+        offset += count
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    prefix_len = len(MAGIC) + 8
+    padded_len = -(-(prefix_len + len(header_bytes)) // DATA_ALIGN) * DATA_ALIGN - prefix_len
+    header_bytes = header_bytes.ljust(padded_len, b' ')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        columns.tofile(f)  # 直接从数组写出，不再生成一份完整的 bytes 副本
+    os.replace(tmp_path, path)
+
+
+class FieldResults:
+    """以内存映射方式打开的 .efd 文件"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是 .efd 电场结果文件: {path}")
+            (header_len,) = struct.unpack('<Q', f.read(8))
+            self.header = json.loads(f.read(header_len).decode('utf-8'))
+        if self.header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"不支持的 .efd 版本 {self.header.get('version')}: {path}")
+
+        n_total = self.header['n_total']
+        if n_total == 0:
+            self._columns = np.empty((len(COLUMNS), 0), dtype=_DTYPE)
+        else:
+            self._columns = np.memmap(path, dtype=np.dtype(self.header['dtype']), mode='r',
+                                      offset=len(MAGIC) + 8 + header_len,
+                                      shape=(len(COLUMNS), n_total))
+
+    @property
+    def tissue_names(self):
+        return list(self.header['tissues'])
+
+    def has(self, name):
+        return name in self.header['tissues']
+
+    def columns(self, name=None):
+        """返回 (4, N) 的列视图；name 为 None 时返回全部组织"""
+        if name is None:
+            return self._columns
+        info = self.header['tissues'][name]
+        return self._columns[:, info['offset']:info['offset'] + info['count']]
+
+    def field(self, name=None):
+        """返回与旧 e_*.npy 形状一致的 (N,4) 视图，每一列在内存中连续"""
+        return self.columns(name).T
+
+    def stats(self, name):
+        """文件头中预先计算的 min / max / mean / std（空组织为 NaN）"""
+        info = self.header['tissues'][name]
+        return {k: np.nan if info[k] is None else info[k] for k in ('min', 'max', 'mean', 'std')}
+
+
+def open_field_results(directory):
+    """打开目录下的 e_fields.efd，不存在或损坏时返回 None"""
+    path = os.path.join(directory, FIELD_RESULTS_FILENAME)
+    if not os.path.isfile(path):
+        return None
+    try:
+        return FieldResults(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Warning: Cannot read field results {path}: {e}")
+        return None
+
+
+def load_legacy_equivalent(npy_path):
+    """
+    按旧文件路径 <dir>/e_<name>.npy 查找同目录 .efd 中的同名组织，
+    找到时返回 (N,4) float32 视图，否则返回 None，由调用方回退到旧格式。
+    """
+    match = _LEGACY_NAME.match(os.path.basename(npy_path))
+    if match is None:
+        return None
+    results = open_field_results(os.path.dirname(npy_path))
+    if results is None or not results.has(match.group(1)):
+        return None
+    return results.field(match.group(1))
+
+
+def _nan_to_none(value):
+    return None if value is None or np.isnan(value) else float(value)
+
+
+def _source_fingerprint(directory, name):
+    """组织数据来源文件（.efd 优先，其次 e_<name>.npy）的大小和修改时间"""
+    results = open_field_results(directory)
+    if results is not None and results.has(name):
+        path = results.path
+    else:
+        path = os.path.join(directory, f'e_{name}.npy')
+    if not os.path.isfile(path):
+        return None
+    st = os.stat(path)
+    return {'file': os.path.basename(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def write_stats_sidecar(directory, summaries, bins=SIDECAR_BINS):
+    """把 {组织名: field_stats.summarize_field 结果} 写入 directory/e_stats.json"""
+    tissues = {}
+    for name, summary in summaries.items():
+        entry = dict(summary)
+        for key in ('min', 'max', 'mean', 'std'):
+            entry[key] = _nan_to_none(entry[key])
+        entry['percentiles'] = {p: _nan_to_none(v) for p, v in entry['percentiles'].items()}
+        entry['source'] = _source_fingerprint(directory, name)
+        tissues[name] = entry
+
+    path = os.path.join(directory, STATS_SIDECAR_FILENAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': STATS_SIDECAR_VERSION, 'bins': bins,
+                   'percentiles': list(SIDECAR_PERCENTILES), 'tissues': tissues}, f)
+    os.replace(tmp_path, path)
+
+
+def load_stats_sidecar(directory, bins=SIDECAR_BINS):
+    """
+    读取 directory/e_stats.json，返回 {组织名: 摘要}。
+    只返回来源文件未变化的组织；文件缺失、格式不符或参数不同则返回空字典。
+    """
+    path = os.path.join(directory, STATS_SIDECAR_FILENAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if (sidecar.get('version') != STATS_SIDECAR_VERSION or sidecar.get('bins') != bins
+            or sidecar.get('percentiles') != list(SIDECAR_PERCENTILES)):
+        return {}
+
+    summaries = {}
+    for name, entry in sidecar.get('tissues', {}).items():
+        if entry.get('source') != _source_fingerprint(directory, name):
+            continue
+        for key in ('min', 'max', 'mean', 'std'):
+            entry[key] = np.nan if entry[key] is None else entry[key]
+        entry['percentiles'] = {p: np.nan if v is None else v for p, v in entry['percentiles'].items()}
+        summaries[name] = entry
+    return summaries
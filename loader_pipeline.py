@@ -0,0 +1,153 @@
+"""
+loader_pipeline.py
+
+界面使用的统一后台加载管线。一个加载任务由若干阶段组成（如读取网格、转换网格、
+读取电场结果），每个阶段有一个权重，阶段函数通过 report(fraction) 报告阶段内进度，
+LoadJob 据此换算成 0-100 的总体百分比。
+
+同一个键（例如 ('subject', 受试者路径)）同时只有一个任务在运行：重复的请求会加入
+已有任务，完成后各自收到回调。请求可以单独取消；一个任务的所有请求都取消后，
+任务在下一次 report 或下一个阶段开始时停止，结果被丢弃。
+
+已取消但线程仍在运行的任务（例如正在执行无法中断的 meshio.read）保留在任务表中，
+直到线程结束：期间同键的新请求会让它恢复运行，而不是再启动一个与之竞争写缓存的任务；
+若任务在恢复前已经停止，线程结束后用同样的阶段为等待中的请求重新启动。
+"""
+
+import traceback
+
+from PyQt6.QtCore import QObject, QThread, pyqtSignal
+
+
+class LoadCancelled(Exception):
+    """任务被取消时由 report() 抛出，阶段函数无需捕获"""
+
+
+class LoadJob(QThread):
+    progress = pyqtSignal(int, str)  # (总体百分比 0-100, 当前阶段名称)
+    done = pyqtSignal(object, object)  # (结果字典, 错误信息；成功时为 None)
+
+    def __init__(self, key, stages):
+        """stages: [(阶段名称, 权重, func)]，func(result, report) 把产物写入 result 字典"""
+        super().__init__()
+        self.key = key
+        self.stages = stages
+        self.result = {}
+        self.requests = []
+        self.last_progress = (0, stages[0][0] if stages else "")
+        self.cancelled = False  # 由 GUI 线程设置，可在线程结束前被新请求清除
+
+    def _reporter(self, label, base, weight, total):
+        def report(fraction):
+            if self.cancelled:
+                raise LoadCancelled()
+            fraction = min(max(fraction, 0.0), 1.0)
+            self.progress.emit(int(100 * (base + weight * fraction) / total), label)
+        return report
+
+    def run(self):
+        total = sum(weight for _, weight, _ in self.stages) or 1
+        base = 0
+        error = None
+        try:
+            for label, weight, func in self.stages:
+                report = self._reporter(label, base, weight, total)
+                report(0.0)
+                func(self.result, report)
+                base += weight
+            self.progress.emit(100, "")
+        except LoadCancelled:
+            return
+        except Exception as e:
+            print(f"加载任务失败 {self.key}: {e}")
+            print(traceback.format_exc())
+            error = str(e)
+        if not self.cancelled:
+            self.done.emit(self.result, error)
+
+
+class LoadRequest:
+    """pipeline.request 返回的句柄，用于取消该请求"""
+
+    def __init__(self, key, on_done, on_progress):
+        self.key = key
+        self.on_done = on_done
+        self.on_progress = on_progress
+
+
+class LoadPipeline(QObject):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.jobs = {}  # 键 -> 线程仍在运行的 LoadJob（包括已取消的）
+        self._threads = set()  # 包括已交付结果但尚未退出的任务，防止 QThread 在运行中被回收
+
+    def request(self, key, stages, on_done, on_progress=None):
+        """
+        请求加载 key；已有同键任务在运行时直接加入（已取消的任务恢复运行），否则用 stages 启动新任务。
+        完成后在 GUI 线程调用 on_done(result, error)，进度通过 on_progress(percent, label) 报告。
+        """
+        job = self.jobs.get(key)
+        if job is None:
+            job = self._start(key, stages)
+        else:
+            job.cancelled = False
+            if on_progress is not None:
+                on_progress(*job.last_progress)
+
+        request = LoadRequest(key, on_done, on_progress)
+        job.requests.append(request)
+        return request
+
+    def _start(self, key, stages):
+        job = LoadJob(key, stages)
+        job.progress.connect(lambda percent, label: self._on_progress(job, percent, label))
+        job.done.connect(lambda result, error: self._on_done(job, result, error))
+        job.finished.connect(lambda: self._on_finished(job))
+        self.jobs[key] = job
+        self._threads.add(job)
+        job.start()
+        return job
+
+    def cancel(self, request):
+        """取消一个请求；同一任务的请求全部取消后停止该任务"""
+        if request is None:
+            return
+        job = self.jobs.get(request.key)
+        if job is None or request not in job.requests:
+            return
+        job.requests.remove(request)
+        if not job.requests:
+            job.cancelled = True
+
+    def cancel_all(self):
+        """取消所有任务（窗口关闭时），不再调用任何回调"""
+        for job in self.jobs.values():
+            job.requests.clear()
+            job.cancelled = True
+
+    def is_loading(self, key):
+        job = self.jobs.get(key)
+        return job is not None and not job.cancelled
+
+    def _on_progress(self, job, percent, label):
+        job.last_progress = (percent, label)
+        for request in list(job.requests):
+            if request.on_progress is not None:
+                request.on_progress(percent, label)
+
+    def _on_done(self, job, result, error):
+        if self.jobs.get(job.key) is job:
+            del self.jobs[job.key]
+        for request in list(job.requests):
+            request.on_done(result, error)
+        job.requests.clear()
+
+    def _on_finished(self, job):
+        self._threads.discard(job)
+        if self.jobs.get(job.key) is not job:
+            return
+        del self.jobs[job.key]
+        if job.requests:
+            # 任务在被恢复之前已经停止，为等待中的请求重新启动
+            restarted = self._start(job.key, job.stages)
+            restarted.requests = job.requests
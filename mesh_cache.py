@@ -0,0 +1,204 @@
+"""
+mesh_cache.py
+
+受试者网格的磁盘缓存：首次读取 sub-control.msh 后，把点坐标与 tetra / triangle
+单元保存为原始 .npy 文件，放在受试者目录下的 .mesh_cache/ 中。之后再次打开时
+直接 np.load，跳过 meshio 的解析；再配合 beforeC_new 的零拷贝转换即可得到 vtkUnstructuredGrid。
+
+缓存以源文件的大小、修改时间和首尾采样哈希为键，源文件变化后自动失效。
+source_key / cache_prefix / load_key_file / store_with_key 同时供 nii_view 的体数据与 MIP
+缓存、surface_pipeline 的表面缓存使用：数据先写，JSON 键文件最后写入。
+
+另外提供按总字节数限制的内存 LRU 缓存 ByteBudgetLRU，供 TMS / TES 流程在页面间
+切换受试者时复用已提取的头部表面。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import meshio
+import numpy as np
+
+from beforeC_new import MESHIO_VTK_CELL_TYPES
+
+CACHE_DIR_NAME = ".mesh_cache"
+CACHE_VERSION = 1
+# 计算哈希时读取文件首尾各 1 MiB，避免对数百 MB 的网格做全量哈希
+HASH_SAMPLE_BYTES = 1 << 20
+
+
+def source_key(path, version=CACHE_VERSION):
+    """返回用于校验缓存的源文件指纹：缓存格式版本、大小、修改时间和首尾采样 SHA1"""
+    st = os.stat(path)
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        sha1.update(f.read(HASH_SAMPLE_BYTES))
+        if st.st_size > HASH_SAMPLE_BYTES:
+            f.seek(max(st.st_size - HASH_SAMPLE_BYTES, HASH_SAMPLE_BYTES))
+            sha1.update(f.read())
+    return {
+        'version': version,
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha1': sha1.hexdigest(),
+    }
+
+
+def cache_prefix(path, cache_dir=CACHE_DIR_NAME):
+    """缓存文件前缀，例如 ./data/males/21-30/01/.mesh_cache/sub-control（.nii.gz 整体视为扩展名）"""
+    directory, name = os.path.split(path)
+    stem = name[:-len('.nii.gz')] if name.endswith('.nii.gz') else os.path.splitext(name)[0]
+    return os.path.join(directory, cache_dir, stem)
+
+
+def load_key_file(key_path, source):
+    """读取 JSON 键文件；其中的 'source' 与 source 一致时返回整个字典，否则返回 None"""
+    try:
+        with open(key_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get('source') != source:
+        return None
+    return cached
+
+
+def store_with_key(key_path, header, write_payload):
+    """
+    先删除旧键文件，再调用 write_payload() 写入数据，最后原子地写入键文件 header。
+    中途失败不会留下可被误用的缓存；OSError 交由调用方处理。
+    """
+    os.makedirs(os.path.dirname(key_path), exist_ok=True)
+    if os.path.exists(key_path):
+        os.remove(key_path)
+    write_payload()
+    tmp_file = key_path + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(header, f)
+    os.replace(tmp_file, key_path)
+
+
+def load_cached_mesh(msh_path, progress=None):
+    """
+    命中且未过期时返回由缓存重建的 meshio.Mesh，否则返回 None。
+    progress(fraction) 在每读完一个数组后调用。
+    """
+    prefix = cache_prefix(msh_path)
+    try:
+        cached = load_key_file(prefix + '.key.json', source_key(msh_path))
+        if cached is None:
+            return None
+        names = cached.get('cells', [])
+        points = np.load(prefix + '.points.npy')
+        cells = []
+        for i, name in enumerate(names):
+            if progress is not None:
+                progress((i + 1) / (len(names) + 1))
+            cells.append((name, np.load(f"{prefix}.{name}.npy")))
+    except (OSError, ValueError):
+        return None
+    return meshio.Mesh(points, cells)
+
+
+def store_cached_mesh(msh_path, mesh):
+    """把网格写入缓存；键文件最后写入，保证中途失败不会留下可被误用的缓存"""
+    prefix = cache_prefix(msh_path)
+    names = [name for name, _ in MESHIO_VTK_CELL_TYPES if name in mesh.cells_dict]
+
+    def write_arrays():
+        np.save(prefix + '.points.npy', np.ascontiguousarray(mesh.points[:, :3]))
+        for name in names:
+            np.save(f"{prefix}.{name}.npy", np.ascontiguousarray(mesh.cells_dict[name]))
+
+    try:
+        store_with_key(prefix + '.key.json', {'source': source_key(msh_path), 'cells': names}, write_arrays)
+    except OSError as e:
+        print(f"写入网格缓存失败 {msh_path}: {e}")
+
+
+def read_mesh_cached(msh_path, progress=None):
+    """
+    优先从磁盘缓存读取网格，未命中时用 meshio 解析并写入缓存。
+    progress(fraction) 报告 0-1 的进度；meshio 解析本身无法细分，完成后一次推进。
+    """
+    mesh = load_cached_mesh(msh_path, progress)
+    if mesh is not None:
+        print(f"网格缓存命中: {msh_path}")
+        return mesh
+    mesh = meshio.read(msh_path)
+    if progress is not None:
+        progress(0.8)
+    store_cached_mesh(msh_path, mesh)
+    return mesh
+
+
+class ByteBudgetLRU:
+    """
+    按总字节数淘汰的 LRU 缓存，线程安全。
+    put 时超出 max_bytes 则从最久未使用的条目开始淘汰；单个条目超过预算时不缓存。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """命中时返回缓存值并标记为最近使用，否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        with self._lock:
+            self._discard(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._discard(key)
+        return None if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+        return entry
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -4,26 +4,199 @@
 interactive_nifti_scroll_viewer_mip_orientations.py
 
 交互式 NIfTI 浏览器：支持轴向/冠状/矢状切片 + 第四象限展示不同方向的最大强度投影 (MIP)。
+
+三个方向的 MIP 在加载时由后台线程一次性计算并缓存在浏览器上，第四象限切换方向时只做查表；
+结果同时写入 .nii.gz 旁的 .mip_cache/ 目录，以源文件大小、修改时间和首尾采样哈希为键（mesh_cache.source_key），下次打开直接读取。
+
+体数据以 NiftiVolume 保持磁盘原始类型，只在取切片时按 scl_slope / scl_inter 缩放，
+不再像 get_fdata() 那样整体转换为 float64。.nii.gz 第一次打开后解压结果写入 .volume_cache/
+（原始字节 + JSON 头），之后用 np.memmap 直接打开，不再重复解压。
+
+滚动切片时默认使用 blitting：恢复该象限缓存的背景，只重绘变化的图像和标题；
+一串滚轮事件合并为一次重绘，scroll_fps 给出滚动重绘的实测帧率。
 """
 
 import os
+import threading
+import time
+from collections import deque
+
 import nibabel as nib
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.backend_bases import TimerBase
+from matplotlib.transforms import Bbox
+
+from mesh_cache import cache_prefix, load_key_file, source_key, store_with_key
+
+MIP_CACHE_DIR = ".mip_cache"
+MIP_CACHE_VERSION = 1
+VOLUME_CACHE_DIR = ".volume_cache"
+VOLUME_CACHE_VERSION = 1
+# 计算滚动帧率时使用的最近帧数
+SCROLL_FPS_WINDOW = 30
+MIP_TITLES = {0: "Sagittal MIP (X-axis)", 1: "Coronal MIP (Y-axis)", 2: "Axial MIP (Z-axis)"}
+
+
+class NiftiVolume:
+    """
+    保持磁盘原始类型的体数据，按 NIfTI 头中的 scl_slope / scl_inter 在取切片时缩放。
+    raw 为 ArrayProxy.get_unscaled() 的结果：未压缩的 .nii 是内存映射，按需读入用到的切片；
+    .nii.gz 只能整体解压，但仍保持原始类型（uint8 标签图只占 1/8 的 float64 内存）。
+    """
+
+    def __init__(self, raw, slope=1.0, intercept=0.0):
+        self.raw = raw
+        self.slope = float(slope)
+        self.intercept = float(intercept)
+
+    @property
+    def shape(self):
+        return self.raw.shape
+
+    @property
+    def scaled(self):
+        return self.slope != 1.0 or self.intercept != 0.0
+
+    @property
+    def resident_nbytes(self):
+        """常驻内存中的字节数；内存映射由操作系统按页读入，记为 0"""
+        return 0 if isinstance(self.raw, np.memmap) else self.raw.nbytes
+
+    def _scale(self, values):
+        if not self.scaled:
+            return values
+        return values.astype(np.float32) * np.float32(self.slope) + np.float32(self.intercept)
+
+    def __getitem__(self, key):
+        return self._scale(np.asarray(self.raw[key]))
+
+    def max(self, axis=None):
+        """沿 axis 的最大值：在原始类型上计算后再缩放，斜率为负时对应原始值的最小值"""
+        raw_max = self.raw.max(axis=axis) if self.slope >= 0 else self.raw.min(axis=axis)
+        return self._scale(np.asarray(raw_max))
+
+
+def load_cached_volume(nii_path):
+    """
+    命中且未过期时以只读内存映射打开解压后的体数据，返回 (NiftiVolume, affine)，否则返回 None。
+    只读映射的页面由操作系统在进程间共享。
+    """
+    prefix = cache_prefix(nii_path, VOLUME_CACHE_DIR)
+    header = load_key_file(prefix + '.json', source_key(nii_path, VOLUME_CACHE_VERSION))
+    if header is None:
+        return None
+    try:
+        raw = np.memmap(prefix + '.raw', dtype=np.dtype(header['dtype']), mode='r',
+                        shape=tuple(header['shape']), order=header['order'])
+    except (OSError, ValueError, KeyError):
+        return None
+    return NiftiVolume(raw, header['slope'], header['intercept']), np.array(header['affine'])
+
 
+def store_cached_volume(nii_path, volume, affine):
+    """把原始类型的体数据写成 .raw 文件，JSON 头（类型、形状、缩放、affine）最后写入"""
+    prefix = cache_prefix(nii_path, VOLUME_CACHE_DIR)
+    raw = np.asarray(volume.raw)
+    order = 'F' if raw.flags.f_contiguous else 'C'
+    header = {
+        'source': source_key(nii_path, VOLUME_CACHE_VERSION),
+        'dtype': raw.dtype.str,
+        'shape': list(raw.shape),
+        'order': order,
+        'slope': volume.slope,
+        'intercept': volume.intercept,
+        'affine': np.asarray(affine).tolist(),
+    }
 
+    def write_raw():
+        with open(prefix + '.raw.tmp', 'wb') as f:
+            raw.ravel(order=order).tofile(f)
+        os.replace(prefix + '.raw.tmp', prefix + '.raw')
 
-def load_nifti(path):
+    try:
+        store_with_key(prefix + '.json', header, write_raw)
+    except OSError as e:
+        print(f"写入体数据缓存失败 {nii_path}: {e}")
+
+
+def load_nifti(path, use_cache=True):
+    """
+    读取 NIfTI 文件，返回 (NiftiVolume, affine)，并打印读取用时与常驻内存。
+    .nii.gz 第一次打开时解压并写入 .volume_cache/，之后直接内存映射缓存文件。
+    """
     if not os.path.isfile(path):
         raise FileNotFoundError(f"文件未找到: {path}")
-    img = nib.load(path)
-    data = img.get_fdata(caching='unchanged')
-    return data, img.affine
+    start = time.perf_counter()
+    compressed = path.endswith('.gz')
+    cached = load_cached_volume(path) if use_cache and compressed else None
+    if cached is not None:
+        volume, affine = cached
+        source = "缓存"
+    else:
+        img = nib.load(path)
+        proxy = img.dataobj
+        slope, intercept = proxy.slope, proxy.inter
+        volume = NiftiVolume(proxy.get_unscaled(),
+                             1.0 if np.isnan(slope) else slope,
+                             0.0 if np.isnan(intercept) else intercept)
+        affine = img.affine
+        source = "文件"
+        if use_cache and compressed:
+            store_cached_volume(path, volume, affine)
+    print(f"读取 NIfTI {path}（{source}）: {volume.shape} {volume.raw.dtype}，"
+          f"用时 {time.perf_counter() - start:.2f} s，常驻 {volume.resident_nbytes / 1024 ** 2:.1f} MB")
+    return volume, affine
+
+
+def _mip_cache_paths(nii_path):
+    prefix = cache_prefix(nii_path, MIP_CACHE_DIR)
+    return prefix + ".mip.npz", prefix + ".mip.key.json"
+
+
+def load_cached_mips(nii_path):
+    """返回缓存的三个方向 MIP 列表（按轴 0/1/2），未命中或已过期时返回 None"""
+    npz_path, key_path = _mip_cache_paths(nii_path)
+    try:
+        if load_key_file(key_path, source_key(nii_path, MIP_CACHE_VERSION)) is None:
+            return None
+        with np.load(npz_path) as cached:
+            return [cached[f'axis{axis}'] for axis in range(3)]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def store_cached_mips(nii_path, mips):
+    """写入磁盘缓存；键文件最后写入，写入失败（如目录只读）时只打印提示"""
+    npz_path, key_path = _mip_cache_paths(nii_path)
+
+    def write_npz():
+        with open(npz_path, 'wb') as f:
+            np.savez(f, **{f'axis{axis}': mip for axis, mip in enumerate(mips)})
+
+    try:
+        store_with_key(key_path, {'source': source_key(nii_path, MIP_CACHE_VERSION)}, write_npz)
+    except OSError as e:
+        print(f"写入 MIP 缓存失败 {nii_path}: {e}")
 
 
 class ScrollSliceViewer:
-    def __init__(self, data):
+    def __init__(self, data, nii_path=None, mips=None, blit=True):
+        """
+        data 为 NiftiVolume 或三维 ndarray；nii_path 用于 MIP 的磁盘缓存，为 None 时不读写缓存；
+        mips 为已计算好的三个方向 MIP，为 None 时在后台线程中计算；
+        blit 为 False 时每次滚动都用 draw_idle 重绘整个图形
+        """
         self.data = data
+        self.nii_path = nii_path
+        self.mips = list(mips) if mips is not None else [None, None, None]
+        self._mip_lock = threading.Lock()
+        self.blit = blit
+        self._pending_steps = {}  # 象限 -> 尚未重绘的累计滚动步数
+        self._flush_timer = None
+        self._blit_regions = None  # 每个象限（图像 + 标题）的像素区域
+        self._backgrounds = None  # 每个象限不含图像和标题的背景
+        self._frame_seconds = deque(maxlen=SCROLL_FPS_WINDOW)
         self.idx = [data.shape[0] // 2,
                     data.shape[1] // 2,
                     data.shape[2] // 2]
@@ -37,6 +210,28 @@ class ScrollSliceViewer:
         self._setup_display()
         plt.tight_layout()
         #plt.show()
+        self.images = [self.axial_im, self.coronal_im, self.sagittal_im, self.mip_im]
+        if self.blit:
+            # 动画图元不参与整图绘制，由 _on_draw 在保存背景后单独绘制
+            for ax, image in zip(self.axes, self.images):
+                image.set_animated(True)
+                ax.title.set_animated(True)
+            self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        if any(mip is None for mip in self.mips):
+            threading.Thread(target=self._precompute_mips, daemon=True).start()
+
+    def mip(self, axis):
+        """返回 axis 方向的 MIP；后台尚未算到该方向时在当前线程计算并缓存"""
+        with self._mip_lock:
+            if self.mips[axis] is None:
+                self.mips[axis] = self.data.max(axis=axis)
+            return self.mips[axis]
+
+    def _precompute_mips(self):
+        for axis in range(3):
+            self.mip(axis)
+        if self.nii_path is not None:
+            store_cached_mips(self.nii_path, self.mips)
 
     def _setup_display(self):
         ax0 = self.axes[0]
@@ -64,7 +259,7 @@ class ScrollSliceViewer:
         ax2.axis('off')
 
         ax3 = self.axes[3]
-        mip = np.max(self.data, axis=self.mip_axis)
+        mip = self.mip(self.mip_axis)
         self.mip_im = ax3.imshow(
             np.rot90(mip), cmap='gray', interpolation='nearest'
         )
@@ -75,21 +270,76 @@ class ScrollSliceViewer:
         step = 1 if event.button == 'up' else -1
         for idx_ax, ax in enumerate(self.axes[:4]):
             if event.inaxes == ax:
-                if idx_ax == 3:
-                    # 在第四象限切换不同方向的 MIP
-                    self.mip_axis = (self.mip_axis + step) % 3
-                    self._update_mip()
-                    self.fig.canvas.draw_idle()
-                    break
-                else:
-                    dim = self.dim_map[idx_ax]
-                    self.idx[dim] = np.clip(
-                        self.idx[dim] + step,
-                        0, self.data.shape[dim] - 1
-                    )
-                    self._update_slice(idx_ax)
-                    self.fig.canvas.draw_idle()
-                    break
+                # 只累计步数，连续的滚轮事件在下一次事件循环中合并为一次重绘
+                self._pending_steps[idx_ax] = self._pending_steps.get(idx_ax, 0) + step
+                self._schedule_flush()
+                break
+
+    def _schedule_flush(self):
+        if self._flush_timer is not None:
+            return
+        timer = self.fig.canvas.new_timer(interval=0)
+        if type(timer) is TimerBase:
+            # 非交互后端没有事件循环，立即重绘
+            self._flush_scroll()
+            return
+        timer.single_shot = True
+        timer.add_callback(self._flush_scroll)
+        self._flush_timer = timer
+        timer.start()
+
+    def _flush_scroll(self):
+        self._flush_timer = None
+        pending, self._pending_steps = self._pending_steps, {}
+        for idx_ax, steps in pending.items():
+            if idx_ax == 3:
+                # 在第四象限切换不同方向的 MIP
+                self.mip_axis = (self.mip_axis + steps) % 3
+                self._update_mip()
+            else:
+                dim = self.dim_map[idx_ax]
+                self.idx[dim] = np.clip(
+                    self.idx[dim] + steps,
+                    0, self.data.shape[dim] - 1
+                )
+                self._update_slice(idx_ax)
+        if pending:
+            self._redraw(pending)
+
+    def _redraw(self, quadrants):
+        if not self.blit or self._backgrounds is None:
+            self.fig.canvas.draw_idle()
+            return
+        start = time.perf_counter()
+        canvas = self.fig.canvas
+        for idx_ax in quadrants:
+            canvas.restore_region(self._backgrounds[idx_ax])
+            self._draw_quadrant(idx_ax)
+            canvas.blit(self._blit_regions[idx_ax])
+        self._frame_seconds.append(time.perf_counter() - start)
+
+    def _on_draw(self, event):
+        """整图重绘（首次显示、缩放窗口）后保存各象限背景，再画上动画图元"""
+        canvas = self.fig.canvas
+        self._blit_regions = [
+            Bbox.union([ax.bbox, ax.title.get_window_extent(event.renderer)]).padded(2)
+            for ax in self.axes
+        ]
+        self._backgrounds = [canvas.copy_from_bbox(region) for region in self._blit_regions]
+        for idx_ax in range(len(self.axes)):
+            self._draw_quadrant(idx_ax)
+
+    def _draw_quadrant(self, idx_ax):
+        self.fig.draw_artist(self.images[idx_ax])
+        self.fig.draw_artist(self.axes[idx_ax].title)
+
+    @property
+    def scroll_fps(self):
+        """最近 SCROLL_FPS_WINDOW 次滚动重绘的实测帧率（1 / 平均重绘用时），尚无数据时为 None"""
+        total = sum(self._frame_seconds)
+        if total <= 0:
+            return None
+        return len(self._frame_seconds) / total
 
     def _update_slice(self, ax_idx):
         if ax_idx == 0:
@@ -109,15 +359,14 @@ class ScrollSliceViewer:
             self.axes[2].set_title(f'Sagittal (X={self.idx[0]})')
 
     def _update_mip(self):
-        mip = np.max(self.data, axis=self.mip_axis)
+        mip = self.mip(self.mip_axis)
         self.mip_im.set_data(np.rot90(mip))
         self.axes[3].set_title(self._mip_title())
 
     def _mip_title(self):
-        axis_names = {0: "Sagittal MIP (X-axis)", 1: "Coronal MIP (Y-axis)", 2: "Axial MIP (Z-axis)"}
-        return axis_names[self.mip_axis]
+        return MIP_TITLES[self.mip_axis]
 
 
 def begin(path):
     data, _ = load_nifti(path)
-    return ScrollSliceViewer(data)
+    return ScrollSliceViewer(data, nii_path=path, mips=load_cached_mips(path))
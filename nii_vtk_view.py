@@ -0,0 +1,216 @@
+"""
+nii_vtk_view.py
+
+基于 VTK 的 NIfTI 浏览器，布局和滚轮操作与 nii_view.ScrollSliceViewer 相同：
+左上 / 右上 / 左下为轴向、冠状、矢状切片（vtkImageReslice → vtkImageSlice），
+右下为 vtkGPUVolumeRayCastMapper 的最大强度投影（MIP），在第四象限滚动切换投影方向。
+
+切片和投影都由 OpenGL 绘制，不再在 CPU 上生成 np.rot90 副本再交给 imshow；
+体数据以磁盘原始类型零拷贝交给 VTK（.volume_cache 的内存映射同样适用），
+MIP 混合模式在软件 OpenGL（Mesa llvmpipe）下也能运行。
+"""
+
+import time
+from collections import deque
+
+import numpy as np
+import vtk
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QWidget, QVBoxLayout
+from vtkmodules.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
+from vtkmodules.util.numpy_support import numpy_to_vtk
+
+import nii_view
+from nii_view import MIP_TITLES, SCROLL_FPS_WINDOW
+
+# 四个象限的视口 (xmin, ymin, xmax, ymax)，顺序与 ScrollSliceViewer.axes 相同
+QUADRANT_VIEWPORTS = ((0.0, 0.5, 0.5, 1.0), (0.5, 0.5, 1.0, 1.0),
+                      (0.0, 0.0, 0.5, 0.5), (0.5, 0.0, 1.0, 0.5))
+# 切片象限 -> (切片所在维度, 输出 x 轴, 输出 y 轴, 标题)，方向与 imshow(np.rot90(...)) 一致
+SLICE_AXES = {
+    0: (2, (1, 0, 0), (0, 1, 0), "Axial (Z={})"),
+    1: (1, (1, 0, 0), (0, 0, 1), "Coronal (Y={})"),
+    2: (0, (0, 1, 0), (0, 0, 1), "Sagittal (X={})"),
+}
+# MIP 方向 -> (相机观察方向, 相机上方向)，画面方向与对应切片一致
+MIP_CAMERAS = {
+    0: ((-1, 0, 0), (0, 0, 1)),
+    1: ((0, 1, 0), (0, 0, 1)),
+    2: ((0, 0, -1), (0, 1, 0)),
+}
+
+
+def volume_to_image_data(volume):
+    """
+    把 NiftiVolume（或三维 ndarray）的原始数据零拷贝包装为 vtkImageData，体素间距为 1。
+    返回 (image, voxels)；voxels 是 VTK 引用的一维数组，调用方需保持其存活。
+    """
+    raw = volume.raw if isinstance(volume, nii_view.NiftiVolume) else volume
+    # VTK 的点顺序是 x 变化最快，即 Fortran 顺序；nibabel 读出的数组本身就是 F 连续，这里不复制
+    voxels = np.asarray(raw).ravel(order='F')
+    image = vtk.vtkImageData()
+    image.SetDimensions(*raw.shape[:3])
+    image.GetPointData().SetScalars(numpy_to_vtk(voxels, deep=False))
+    return image, voxels
+
+
+def build_title(renderer):
+    title = vtk.vtkTextActor()
+    prop = title.GetTextProperty()
+    prop.SetFontSize(16)
+    prop.SetColor(0, 0, 0)
+    prop.SetJustificationToCentered()
+    prop.SetVerticalJustificationToTop()
+    title.GetPositionCoordinate().SetCoordinateSystemToNormalizedViewport()
+    title.SetPosition(0.5, 0.97)
+    renderer.AddViewProp(title)
+    return title
+
+
+class VtkSliceViewer(QWidget):
+    def __init__(self, volume, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.vtk_widget = QVTKRenderWindowInteractor(self)
+        layout.addWidget(self.vtk_widget)
+        self.render_window = self.vtk_widget.GetRenderWindow()
+        self.interactor = self.render_window.GetInteractor()
+        # 与 matplotlib 版一致：视图固定，滚轮只用于切换切片和投影方向
+        self.interactor.SetInteractorStyle(vtk.vtkInteractorStyleUser())
+
+        self.volume = volume
+        self.image, self._voxels = volume_to_image_data(volume)
+        self.shape = self.image.GetDimensions()
+        self.idx = [n // 2 for n in self.shape]
+        self.mip_axis = 2  # 初始方向为轴向 (Z)
+        low, high = self.image.GetScalarRange()
+
+        self.renderers = []
+        self.titles = []
+        for viewport in QUADRANT_VIEWPORTS:
+            renderer = vtk.vtkRenderer()
+            renderer.SetViewport(*viewport)
+            renderer.SetBackground(1, 1, 1)
+            renderer.GetActiveCamera().ParallelProjectionOn()
+            self.render_window.AddRenderer(renderer)
+            self.renderers.append(renderer)
+            self.titles.append(build_title(renderer))
+
+        self.reslices = {}
+        for quadrant, (dim, x_axis, y_axis, _) in SLICE_AXES.items():
+            reslice = vtk.vtkImageReslice()
+            reslice.SetInputData(self.image)
+            reslice.SetOutputDimensionality(2)
+            reslice.SetInterpolationModeToNearestNeighbor()
+            reslice.SetResliceAxesDirectionCosines(*x_axis, *y_axis, *np.cross(x_axis, y_axis))
+            self.reslices[quadrant] = reslice
+
+            mapper = vtk.vtkImageSliceMapper()
+            mapper.SetInputConnection(reslice.GetOutputPort())
+            image_slice = vtk.vtkImageSlice()
+            image_slice.SetMapper(mapper)
+            image_slice.GetProperty().SetColorWindow(high - low)
+            image_slice.GetProperty().SetColorLevel(0.5 * (high + low))
+            image_slice.GetProperty().SetInterpolationTypeToNearest()
+            self.renderers[quadrant].AddViewProp(image_slice)
+            self._update_slice(quadrant)
+            self.renderers[quadrant].ResetCamera()
+
+        mip_mapper = vtk.vtkGPUVolumeRayCastMapper()
+        mip_mapper.SetInputData(self.image)
+        mip_mapper.SetBlendModeToMaximumIntensity()
+        color = vtk.vtkColorTransferFunction()
+        color.AddRGBPoint(low, 0, 0, 0)
+        color.AddRGBPoint(high, 1, 1, 1)
+        opacity = vtk.vtkPiecewiseFunction()
+        opacity.AddPoint(low, 1.0)
+        opacity.AddPoint(high, 1.0)
+        mip_property = vtk.vtkVolumeProperty()
+        mip_property.SetColor(color)
+        mip_property.SetScalarOpacity(opacity)
+        mip_property.SetInterpolationTypeToNearest()
+        self.mip_volume = vtk.vtkVolume()
+        self.mip_volume.SetMapper(mip_mapper)
+        self.mip_volume.SetProperty(mip_property)
+        self.renderers[3].AddViewProp(self.mip_volume)
+        self._update_mip()
+
+        self._pending_steps = {}  # 象限 -> 尚未重绘的累计滚动步数
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(0)
+        self._flush_timer.timeout.connect(self._flush_scroll)
+        self._frame_seconds = deque(maxlen=SCROLL_FPS_WINDOW)
+        self._observers = [self.interactor.AddObserver(event, self.on_wheel)
+                           for event in ('MouseWheelForwardEvent', 'MouseWheelBackwardEvent')]
+
+    def on_wheel(self, caller, event):
+        step = 1 if event == 'MouseWheelForwardEvent' else -1
+        x, y = self.interactor.GetEventPosition()
+        renderer = self.interactor.FindPokedRenderer(x, y)
+        if renderer not in self.renderers:
+            return
+        # 只累计步数，连续的滚轮事件在下一次事件循环中合并为一次渲染
+        quadrant = self.renderers.index(renderer)
+        self._pending_steps[quadrant] = self._pending_steps.get(quadrant, 0) + step
+        self._flush_timer.start()
+
+    def _flush_scroll(self):
+        pending, self._pending_steps = self._pending_steps, {}
+        for quadrant, steps in pending.items():
+            if quadrant == 3:
+                # 在第四象限切换不同方向的 MIP
+                self.mip_axis = (self.mip_axis + steps) % 3
+                self._update_mip()
+            else:
+                dim = SLICE_AXES[quadrant][0]
+                self.idx[dim] = int(np.clip(self.idx[dim] + steps, 0, self.shape[dim] - 1))
+                self._update_slice(quadrant)
+        if pending:
+            start = time.perf_counter()
+            self.render_window.Render()
+            self._frame_seconds.append(time.perf_counter() - start)
+
+    def _update_slice(self, quadrant):
+        dim, _, _, title = SLICE_AXES[quadrant]
+        origin = [0, 0, 0]
+        origin[dim] = self.idx[dim]
+        self.reslices[quadrant].SetResliceAxesOrigin(*origin)
+        self.titles[quadrant].SetInput(title.format(self.idx[dim]))
+
+    def _update_mip(self):
+        direction, view_up = MIP_CAMERAS[self.mip_axis]
+        camera = self.renderers[3].GetActiveCamera()
+        center = self.image.GetCenter()
+        camera.SetFocalPoint(*center)
+        camera.SetPosition(*(c - d for c, d in zip(center, direction)))
+        camera.SetViewUp(*view_up)
+        self.renderers[3].ResetCamera()
+        # ResetCamera 按三维包围球取景；改为按投影平面的对角线取景，与切片象限的大小一致
+        plane = [n - 1 for axis, n in enumerate(self.shape) if axis != self.mip_axis]
+        camera.SetParallelScale(0.5 * np.hypot(*plane))
+        self.titles[3].SetInput(MIP_TITLES[self.mip_axis])
+
+    @property
+    def scroll_fps(self):
+        """最近 SCROLL_FPS_WINDOW 次滚动渲染的实测帧率（1 / 平均渲染用时），尚无数据时为 None"""
+        total = sum(self._frame_seconds)
+        if total <= 0:
+            return None
+        return len(self._frame_seconds) / total
+
+    def dispose(self):
+        """页面被移除时释放渲染资源：移除观察者、清空渲染器并关闭渲染窗口（显存中的体纹理）"""
+        self._flush_timer.stop()
+        for observer in self._observers:
+            self.interactor.RemoveObserver(observer)
+        self._observers = []
+        for renderer in self.renderers:
+            renderer.RemoveAllViewProps()
+        self.vtk_widget.Finalize()
+
+
+def begin(path):
+    volume, _ = nii_view.load_nifti(path)
+    return VtkSliceViewer(volume)
@@ -0,0 +1,53 @@
+"""
+page_lifecycle.py
+
+MainWindow 中 QStackedWidget 页面的资源释放与进程内存读数。
+
+页面被移出堆栈时，dispose_page 调用页面中各 VTK 视图的 dispose()（清空渲染器、
+关闭渲染窗口），清空并关闭 matplotlib 图形（pyplot 管理的图形不会随控件删除而释放），
+最后 deleteLater 删除控件。process_rss_bytes 用于验证反复导航后内存保持稳定。
+"""
+
+import os
+
+import matplotlib.pyplot as plt
+from matplotlib.backend_bases import FigureCanvasBase
+from PyQt6.QtWidgets import QWidget
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def dispose_page(page):
+    """释放页面中的 VTK 与 matplotlib 资源并删除页面"""
+    for widget in [page] + page.findChildren(QWidget):
+        dispose = getattr(widget, 'dispose', None)
+        if callable(dispose):
+            try:
+                dispose()
+            except RuntimeError as e:
+                print(f"释放页面资源失败: {e}")
+        if isinstance(widget, FigureCanvasBase):
+            widget.figure.clear()
+            plt.close(widget.figure)
+    page.deleteLater()
+
+
+def process_rss_bytes():
+    """当前进程的常驻内存（字节）；优先使用 psutil，其次 /proc，均不可用时返回 None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def format_memory(nbytes):
+    if nbytes is None:
+        return "未知"
+    return f"{nbytes / 1024 ** 2:.0f} MB"
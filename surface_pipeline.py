@@ -0,0 +1,174 @@
+"""
+surface_pipeline.py
+
+组织网格的渲染预处理：从四面体 vtkUnstructuredGrid 中一次性提取外表面，
+可选地用二次误差抽稀到指定三角形数量，再计算法线，得到可直接交给
+vtkPolyDataMapper 的 vtkPolyData。这样渲染时不再由 vtkDataSetMapper
+在每次管线更新时重新提取表面，也不会绘制数百万个内部面片。
+
+处理结果同时缓存在内存（按字节预算淘汰的 LRU）和源文件旁的 .surface_cache/ 目录
+（二进制 .vtp），以 mesh_cache.source_key 给出的源文件指纹和三角形预算为键。
+
+load_lod_levels 为交互时的多分辨率渲染生成三级几何：全分辨率表面、抽稀表面和稀疏点精灵。
+"""
+
+import os
+
+import vtk
+
+from mesh_cache import ByteBudgetLRU, cache_prefix, load_key_file, source_key, store_with_key
+
+SURFACE_CACHE_DIR = ".surface_cache"
+SURFACE_CACHE_VERSION = 2
+# 每个组织默认的三角形预算，保证五个组织同时显示时在普通笔记本上也能流畅旋转
+DEFAULT_TRIANGLE_BUDGET = 150000
+# 最低细节级别使用的点精灵数量
+DEFAULT_SPRITE_POINTS = 5000
+# 内存中表面缓存的总字节预算，超出时淘汰最久未使用的表面，其余由磁盘缓存补上
+SURFACE_MEMORY_MAX_BYTES = 512 * 1024 ** 2
+
+_memory_cache = ByteBudgetLRU(SURFACE_MEMORY_MAX_BYTES)
+
+
+def _remember(memory_key, key, polydata):
+    _memory_cache.put(memory_key, (key, polydata), polydata.GetActualMemorySize() * 1024)
+
+
+def extract_surface(data):
+    """提取数据集外表面并三角化；点数据（如标量 "e"）与顶点单元会被保留"""
+    surface = vtk.vtkDataSetSurfaceFilter()
+    surface.SetInputData(data)
+    triangles = vtk.vtkTriangleFilter()
+    triangles.SetInputConnection(surface.GetOutputPort())
+    triangles.PassVertsOn()
+    triangles.PassLinesOn()
+    triangles.Update()
+    return triangles.GetOutput()
+
+
+def decimate_surface(polydata, target_triangles):
+    """用二次误差抽稀把三角面片数降到 target_triangles 左右，不超过预算时原样返回"""
+    n_triangles = polydata.GetNumberOfPolys()
+    if target_triangles is None or n_triangles <= target_triangles:
+        return polydata
+    decimate = vtk.vtkQuadricDecimation()
+    decimate.SetInputData(polydata)
+    decimate.SetTargetReduction(1.0 - target_triangles / n_triangles)
+    decimate.VolumePreservationOn()
+    decimate.Update()
+    return decimate.GetOutput()
+
+
+def compute_normals(polydata):
+    normals = vtk.vtkPolyDataNormals()
+    normals.SetInputData(polydata)
+    normals.ComputePointNormalsOn()
+    normals.SplittingOff()
+    normals.Update()
+    return normals.GetOutput()
+
+
+def build_render_surface(data, target_triangles=DEFAULT_TRIANGLE_BUDGET):
+    """提取表面 → 可选抽稀 → 计算法线；target_triangles 为 None 时保留全部面片"""
+    return compute_normals(decimate_surface(extract_surface(data), target_triangles))
+
+
+def _cache_paths(filename, target_triangles):
+    level = "full" if target_triangles is None else str(target_triangles)
+    prefix = f"{cache_prefix(filename, SURFACE_CACHE_DIR)}.{level}"
+    return prefix + ".vtp", prefix + ".key.json"
+
+
+def _source_key(filename, target_triangles):
+    return {'file': source_key(filename, SURFACE_CACHE_VERSION), 'target_triangles': target_triangles}
+
+
+def load_cached_surface(filename, target_triangles=DEFAULT_TRIANGLE_BUDGET):
+    """返回缓存的表面（先查内存再查磁盘），未命中或已过期时返回 None"""
+    try:
+        key = _source_key(filename, target_triangles)
+    except OSError:
+        return None
+    memory_key = (os.path.abspath(filename), target_triangles)
+    entry = _memory_cache.get(memory_key)
+    if entry is not None and entry[0] == key:
+        return entry[1]
+
+    vtp_path, key_path = _cache_paths(filename, target_triangles)
+    if load_key_file(key_path, key) is None:
+        return None
+    reader = vtk.vtkXMLPolyDataReader()
+    reader.SetFileName(vtp_path)
+    reader.Update()
+    polydata = reader.GetOutput()
+    if reader.GetErrorCode() != 0 or polydata is None or polydata.GetNumberOfPoints() == 0:
+        return None
+    _remember(memory_key, key, polydata)
+    return polydata
+
+
+def store_cached_surface(filename, polydata, target_triangles=DEFAULT_TRIANGLE_BUDGET):
+    """写入内存与磁盘缓存；磁盘写入失败（如目录只读）时仅保留内存缓存"""
+    key = _source_key(filename, target_triangles)
+    _remember((os.path.abspath(filename), target_triangles), key, polydata)
+
+    vtp_path, key_path = _cache_paths(filename, target_triangles)
+
+    def write_vtp():
+        writer = vtk.vtkXMLPolyDataWriter()
+        writer.SetFileName(vtp_path)
+        writer.SetInputData(polydata)
+        writer.SetDataModeToAppended()
+        writer.EncodeAppendedDataOff()
+        writer.SetCompressorTypeToLZ4()
+        if not writer.Write():
+            raise OSError("vtkXMLPolyDataWriter 写入失败")
+
+    try:
+        store_with_key(key_path, {'source': key}, write_vtp)
+    except OSError as e:
+        print(f"写入表面缓存失败 {filename}: {e}")
+
+
+def load_render_surface(filename, loader, target_triangles=DEFAULT_TRIANGLE_BUDGET):
+    """
+    返回 filename 对应的渲染表面。命中缓存时不读取原始网格；
+    否则调用 loader(filename) 读取网格、生成表面并写入缓存。读取失败返回 None。
+    """
+    polydata = load_cached_surface(filename, target_triangles)
+    if polydata is not None:
+        return polydata
+    data = loader(filename)
+    if data is None:
+        return None
+    polydata = build_render_surface(data, target_triangles)
+    store_cached_surface(filename, polydata, target_triangles)
+    return polydata
+
+
+def build_point_sprites(polydata, max_points=DEFAULT_SPRITE_POINTS):
+    """从表面随机抽取至多 max_points 个点，每点一个顶点单元，作为最低细节级别"""
+    mask = vtk.vtkMaskPoints()
+    mask.SetInputData(polydata)
+    mask.SetMaximumNumberOfPoints(max_points)
+    mask.RandomModeOn()
+    mask.GenerateVerticesOn()
+    mask.SingleVertexPerCellOn()
+    mask.Update()
+    return mask.GetOutput()
+
+
+def load_lod_levels(filename, loader, target_triangles=DEFAULT_TRIANGLE_BUDGET,
+                    sprite_points=DEFAULT_SPRITE_POINTS):
+    """
+    返回从高到低的细节级别 [全分辨率表面, 抽稀表面, 点精灵]；
+    全分辨率表面已在预算内时不生成抽稀级别。读取失败返回 None。
+    """
+    full = load_render_surface(filename, loader, None)
+    if full is None:
+        return None
+    levels = [full]
+    if target_triangles is not None and full.GetNumberOfPolys() > target_triangles:
+        levels.append(load_render_surface(filename, lambda _: full, target_triangles))
+    levels.append(build_point_sprites(levels[-1], sprite_points))
+    return levels
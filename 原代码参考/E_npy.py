@@ -1,6 +1,11 @@
 import numpy as np
 from simnibs.mesh_tools.mesh_io import read_msh
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from field_store import write_field_results, FIELD_RESULTS_FILENAME, write_stats_sidecar
+from field_stats import summarize_field
 
 # 1. 读取网格
 mesh_path = 'tms_simu/ernie_TMS_1-0001_Magstim_70mm_Fig8_scalar.msh'
@@ -22,7 +27,9 @@ emag = mesh.field['magnE'][:]  # (n_elm,)
 # 4. 为每个组织生成 (N,4) 数组并保存
 out_dir = 'npy_outputs'
 os.makedirs(out_dir, exist_ok=True)
+WRITE_LEGACY_NPY = True  # 同时输出旧版 e_*.npy，供尚未升级的程序读取
 
+tissues = {}
 for name, tag in TISSUE_TAGS.items():
     # 4.1 构造掩码，筛选该组织单元
     mask = (mesh.elm.tag1 == tag)
@@ -33,8 +40,19 @@ for name, tag in TISSUE_TAGS.items():
 
     # 4.3 合并为 (Ni,4)
     data = np.hstack((coords, fields))
+    tissues[name] = data
 
     # 4.4 保存为 .npy
-    fname = os.path.join(out_dir, f'e_{name}.npy')
-    np.save(fname, data)
-    print(f"Saved {coords.shape[0]} entries for {name} → {fname}")
+    if WRITE_LEGACY_NPY:
+        fname = os.path.join(out_dir, f'e_{name}.npy')
+        np.save(fname, data)
+        print(f"Saved {coords.shape[0]} entries for {name} → {fname}")
+
+# 5. 所有组织写入一个列式 float32 文件（含组织偏移表与统计量）
+efd_path = os.path.join(out_dir, FIELD_RESULTS_FILENAME)
+write_field_results(efd_path, tissues)
+print(f"Saved {sum(len(d) for d in tissues.values())} entries for all tissues → {efd_path}")
+
+# 6. 写出统计量边车文件，结果页无需再全量扫描电场数据
+write_stats_sidecar(out_dir, {name: summarize_field(data) for name, data in tissues.items()})
+print(f"Saved statistics sidecar → {out_dir}")